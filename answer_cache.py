@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+class SemanticAnswerCache:
+    """In-memory cache of LLM answers for near-identical questions over the same documents.
+
+    Entries are partitioned by (document fingerprint, intent) and shared by
+    every user and chat, so callers must only cache answers whose prompt held
+    nothing but the documents and the question (no chat history). Within a
+    partition, a cached answer is served when the cosine similarity between
+    the new and the cached query embedding reaches threshold. Entries expire
+    after ttl seconds and the least recently used ones are evicted beyond
+    max_entries.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint: str, intent: str, query_embedding: List[float]) -> Optional[Tuple[str, List[str]]]:
+        """Return (answer, sources) for the closest cached question, or None."""
+        query = self._normalize(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry["created"] > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                if entry["scope"] != (fingerprint, intent):
+                    continue
+                score = float(np.dot(query, entry["embedding"]))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            entry = self._entries[best_id]
+        logger.info(f"Answer cache hit (similarity {best_score:.3f})")
+        return entry["answer"], list(entry["sources"])
+
+    def put(self, fingerprint: str, intent: str, query_embedding: List[float], answer: str, sources: List[str]):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "scope": (fingerprint, intent),
+                "embedding": self._normalize(query_embedding),
+                "answer": answer,
+                "sources": list(sources),
+                "created": time.monotonic()
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._entries)
+        total = hits + misses
+        return {
+            'answer_cache_hits': hits,
+            'answer_cache_misses': misses,
+            'answer_cache_hit_rate': round(hits / total, 3) if total else 0.0,
+            'llm_calls_saved': hits,
+            'answer_cache_entries': size
+        }
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Return the process-wide SemanticAnswerCache, creating it on first use."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache()
+    return _answer_cache
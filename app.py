@@ -1,11 +1,17 @@
 import streamlit as st
 import time
+import queue
 from groq import Groq
 from database import ChromaVectorDatabase
-from utils import process_attachment, login_user_base64 as login_user, register_user_base64 as register_user, save_chat_history, get_chat_history, get_user_chats, log_user_activity, log_file_processing, init_database, delete_chat_history
+from ingest import diff_files, ingest_files
+from answer_cache import get_answer_cache
+from export import EXPORT_FORMATS, write_chat_export, write_all_chats_zip, export_filename, export_mime
+from llm_executor import get_llm_executor, JobCancelledError, LLM_REQUEST_TIMEOUT
+from completion import STREAM_RENDER_INTERVAL, estimate_tokens, stream_completion
+from chat_view import CHAT_RENDER_WINDOW, HISTORY_PAGE_TURNS, history_to_messages, render_chat_message, render_messages_html
+from utils import login_user_base64 as login_user, register_user_base64 as register_user, save_chat_history, get_chat_history, get_chat_file_sources, get_user_chats, get_user_analytics, allocate_chat_id, log_user_activity, log_file_processing, init_database, delete_chat_history, init_db_pool, get_db_pool_stats, save_chat_collection, get_chat_collection, evict_chat_collections, LoginThrottledError, forwarded_client_ip, issue_session_token, verify_session_token
 from langchain.docstore.document import Document
 import logging
-import psycopg2
 
 # Set up logging
 logging.basicConfig(
@@ -24,38 +30,42 @@ if "GROQ_API_KEY" not in st.secrets or "DATABASE_URL" not in st.secrets:
     st.error("❌ Missing required secrets. Please configure GROQ_API_KEY and DATABASE_URL in Streamlit Secrets.")
     st.stop()
 
+# "vector" (embeddings only) or "hybrid" (embeddings fused with BM25 keyword search)
+RETRIEVAL_MODE = "hybrid"
+# Estimated-token budgets for the retrieved context and the chat history in each prompt
+CONTEXT_TOKEN_BUDGET = 1800
+HISTORY_TOKEN_BUDGET = 300
+# Total chunks kept across all chats' collections; least recently used chats are dropped beyond this
+CHAT_COLLECTION_CHUNK_QUOTA = 500000
+
 # Initialize Groq client
 try:
-    client = Groq(api_key=GROQ_API_KEY)
+    # Retries are left to the LLM executor, which backs off and requeues fairly
+    client = Groq(api_key=GROQ_API_KEY, timeout=LLM_REQUEST_TIMEOUT, max_retries=0)
     logger.info("Groq client initialized successfully")
 except Exception as e:
     st.error(f"❌ Failed to initialize Groq client: {str(e)}")
     logger.error(f"Groq initialization error: {str(e)}")
     st.stop()
 
-# Initialize vector database
+# Initialize vector database (a per-session handle; the embedding model and
+# Chroma client behind it are shared by every session in the process)
 if "vector_db" not in st.session_state:
     try:
-        st.session_state.vector_db = ChromaVectorDatabase(persist_directory="/data/chroma_db")  # Adjusted for Render's filesystem
+        st.session_state.vector_db = ChromaVectorDatabase(persist_directory="/data/chroma_db", cache_directory="/data/embedding_cache")  # Adjusted for Render's filesystem
         logger.info("Vector database initialized")
     except Exception as e:
         st.error(f"❌ Failed to initialize vector database: {str(e)}")
         logger.error(f"Vector database initialization error: {str(e)}")
         st.stop()
 
-# Initialize database connection
-if "db_connection" not in st.session_state:
-    try:
-        st.session_state.db_connection = psycopg2.connect(DATABASE_URL)
-        logger.info("Database connection established and stored in session state")
-    except Exception as e:
-        st.error(f"❌ Failed to establish database connection: {str(e)}")
-        logger.error(f"Database connection error: {str(e)}")
-        st.stop()
-
-# Function to get database connection from session state
-def get_db_connection():
-    return st.session_state.db_connection
+# Initialize the process-wide database connection pool (no-op after the first session)
+try:
+    init_db_pool(DATABASE_URL)
+except Exception as e:
+    st.error(f"❌ Failed to establish database connection: {str(e)}")
+    logger.error(f"Database connection error: {str(e)}")
+    st.stop()
 
 # Initialize session state with default values
 if "page" not in st.session_state:
@@ -68,14 +78,24 @@ if "chat_id" not in st.session_state:
     st.session_state.chat_id = 1
 if "current_files" not in st.session_state:
     st.session_state.current_files = []
-if "current_files_id" not in st.session_state:
-    st.session_state.current_files_id = None
+if "uploader_files" not in st.session_state:  # Filenames in the current chat's uploader when last ingested
+    st.session_state.uploader_files = []
+if "session_token" not in st.session_state:  # Signed proof of login, also kept in the URL so a refresh skips bcrypt
+    st.session_state.session_token = None
 if "loaded_chat" not in st.session_state:  # Track if a chat is loaded
     st.session_state.loaded_chat = False
+if "history_before_id" not in st.session_state:  # Keyset cursor: oldest chat_history row loaded
+    st.session_state.history_before_id = None
+if "history_has_more" not in st.session_state:
+    st.session_state.history_has_more = False
+if "render_window" not in st.session_state:
+    st.session_state.render_window = CHAT_RENDER_WINDOW
+if "pending_turn" not in st.session_state:  # Chat turn still running on the LLM executor
+    st.session_state.pending_turn = None
 
 # Database setup with error handling
 try:
-    init_database()  # Uses the session connection
+    init_database()  # Runs pending migrations once per process; later reruns return immediately
     logger.info("Database initialized successfully")
 except Exception as e:
     st.error(f"❌ Failed to initialize database: {str(e)}")
@@ -344,12 +364,29 @@ def show_typing_indicator():
     </div>
     """, unsafe_allow_html=True)
 
+def reset_history_paging():
+    st.session_state.history_before_id = None
+    st.session_state.history_has_more = False
+    st.session_state.render_window = CHAT_RENDER_WINDOW
+
+def load_history_page():
+    """Prepend the next HISTORY_PAGE_TURNS older turns of the current chat to the messages."""
+    history = get_chat_history(st.session_state.user, st.session_state.chat_id, limit=HISTORY_PAGE_TURNS,
+                               before_id=st.session_state.history_before_id)
+    if history:
+        st.session_state.history_before_id = history[0]["id"]
+        st.session_state.messages = history_to_messages(history) + st.session_state.messages
+    st.session_state.history_has_more = len(history) == HISTORY_PAGE_TURNS
+    return history
+
 def new_chat():
     """Start a new chat session."""
     st.session_state.messages = []
-    st.session_state.chat_id = max(get_user_chats(st.session_state.user), default=0) + 1
+    reset_history_paging()
+    st.session_state.chat_id = allocate_chat_id()
     st.session_state.current_files = []
-    st.session_state.current_files_id = None
+    st.session_state.uploader_files = []
+    st.session_state.vector_db.use_namespace(st.session_state.user, st.session_state.chat_id)
     st.session_state.vector_db.clear_database()
     st.session_state.loaded_chat = False  # Reset loaded chat flag
     log_user_activity(st.session_state.user, "new_chat", f"chat_id: {st.session_state.chat_id}")
@@ -360,75 +397,72 @@ def load_selected_chat(selected_chat_id: int):
     """Load a previously selected chat."""
     if selected_chat_id != st.session_state.chat_id:
         st.session_state.chat_id = selected_chat_id
+        st.session_state.vector_db.use_namespace(st.session_state.user, selected_chat_id)
         st.session_state.messages = []
-        history = get_chat_history(st.session_state.user, selected_chat_id)
-        for entry in history:
-            if entry['user_message']:
-                st.session_state.messages.append({
-                    "role": "user",
-                    "content": entry['user_message'],
-                    "timestamp": entry['timestamp']
-                })
-            if entry['bot_response']:
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": entry['bot_response'],
-                    "timestamp": entry['timestamp'],
-                    "sources": entry.get('file_sources', [])
-                })
-        # Restore files from chat history metadata (assuming stored in history)
-        files = set()
-        for entry in history:
-            files.update(entry.get('file_sources', []))
-        st.session_state.current_files = list(files) if files else []
-        st.session_state.current_files_id = hash(tuple(st.session_state.current_files)) if st.session_state.current_files else None
+        reset_history_paging()
+        load_history_page()  # Newest turns only; older pages load on demand
+        collection_ref = get_chat_collection(st.session_state.user, selected_chat_id)
+        if collection_ref and st.session_state.vector_db.has_documents():
+            # The chat's index is still on disk: reattach it instead of re-processing files
+            st.session_state.vector_db.file_keys = dict(collection_ref["file_keys"])
+            st.session_state.current_files = list(collection_ref["file_keys"])
+        else:
+            # Restore files from chat history metadata
+            st.session_state.current_files = get_chat_file_sources(st.session_state.user, selected_chat_id)
+        st.session_state.uploader_files = []  # The chat gets its own, empty uploader
         st.session_state.loaded_chat = True  # Set loaded chat flag
         log_user_activity(st.session_state.user, "load_chat", f"chat_id: {selected_chat_id}")
         st.rerun()
 
+def persist_chat_collection():
+    """Record the current chat's collection and garbage-collect old ones beyond the storage quota."""
+    vector_db = st.session_state.vector_db
+    save_chat_collection(st.session_state.user, st.session_state.chat_id, vector_db.collection_name, vector_db.file_keys, vector_db.chunk_count())
+    for collection_name in evict_chat_collections(CHAT_COLLECTION_CHUNK_QUOTA):
+        vector_db.drop_collection(collection_name)
+
 def export_chat_history():
-    """Export current chat history as a TXT file."""
-    chat_content = f"Chat ID: {st.session_state.chat_id}\nUser: {st.session_state.user}\nExport Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-    for msg in st.session_state.messages:
-        role = msg["role"].capitalize()
-        content = msg["content"]
-        timestamp = format_timestamp(msg.get("timestamp", ""))
-        chat_content += f"{role}: {content} [{timestamp}]\n"
-        if role == "Assistant" and msg.get("sources"):
-            chat_content += f"Sources: {', '.join(msg['sources'])}\n"
-        chat_content += "-" * 50 + "\n"
+    """Offer the current chat's full stored history for download in the chosen format."""
+    export_format = st.session_state.get("export_format", "txt")
+    export_file = write_chat_export(st.session_state.user, st.session_state.chat_id, export_format)
     st.download_button(
         label="📥 Export Chat History",
-        data=chat_content,
-        file_name=f"chat_export_{st.session_state.chat_id}_{time.strftime('%Y%m%d_%H%M%S')}.txt",
-        mime="text/plain",
+        data=export_file,
+        file_name=export_filename(st.session_state.chat_id, export_format),
+        mime=export_mime(export_format),
         key=f"export_chat_{st.session_state.chat_id}"
     )
-    log_user_activity(st.session_state.user, "export_chat", f"chat_id: {st.session_state.chat_id}")
+    log_user_activity(st.session_state.user, "export_chat", f"chat_id: {st.session_state.chat_id}, format: {export_format}")
+
+def export_all_chats():
+    """Offer every chat of the user as a zip of transcripts."""
+    export_format = st.session_state.get("export_format", "txt")
+    export_file = write_all_chats_zip(st.session_state.user, export_format)
+    st.download_button(
+        label="📦 Download All Chats (zip)",
+        data=export_file,
+        file_name=export_filename(None, export_format),
+        mime="application/zip",
+        key="export_all_chats"
+    )
+    log_user_activity(st.session_state.user, "export_all_chats", f"format: {export_format}")
 
 def delete_chat():
     """Delete the current chat."""
     if st.button("🗑️ Delete Chat", key="delete_chat_btn"):
         delete_chat_history(st.session_state.user, st.session_state.chat_id)
+        st.session_state.vector_db.drop_collection(st.session_state.vector_db.collection_name)  # Only this chat's data
         st.session_state.messages = []
-        st.session_state.chat_id = max(get_user_chats(st.session_state.user), default=0) + 1
+        reset_history_paging()
+        st.session_state.chat_id = allocate_chat_id()
+        st.session_state.vector_db.use_namespace(st.session_state.user, st.session_state.chat_id)
         st.session_state.current_files = []
-        st.session_state.current_files_id = None
-        st.session_state.vector_db.clear_database()
+        st.session_state.uploader_files = []
         st.session_state.loaded_chat = False  # Reset loaded chat flag
         st.success("✅ Chat deleted successfully!")
         log_user_activity(st.session_state.user, "delete_chat", f"chat_id: {st.session_state.chat_id}")
         st.rerun()
 
-def format_timestamp(timestamp_str):
-    """Format timestamp for display."""
-    try:
-        if timestamp_str:
-            return time.strftime("%I:%M %p", time.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S"))
-        return ""
-    except:
-        return ""
-
 def detect_query_intent(query: str) -> dict:
     """Detect intent based on keywords."""
     query_lower = query.lower()
@@ -445,11 +479,81 @@ def detect_query_intent(query: str) -> dict:
             break
     return {"intent": detected_intent, "query": query}
 
+def strip_overlap(text: str, selected_texts: list, min_overlap: int = 30, max_overlap: int = 400) -> str:
+    """Remove text shared with already selected chunks (splitter overlap); "" if nothing new is left."""
+    for selected in selected_texts:
+        if text in selected:
+            return ""
+        # Tail of a selected chunk repeated at the start of this one
+        for length in range(min(max_overlap, len(text), len(selected)), min_overlap - 1, -1):
+            if selected.endswith(text[:length]):
+                text = text[length:]
+                break
+        # Head of a selected chunk repeated at the end of this one
+        for length in range(min(max_overlap, len(text), len(selected)), min_overlap - 1, -1):
+            if selected.startswith(text[-length:]):
+                text = text[:-length]
+                break
+    return text
+
+def format_location(metadata: dict) -> str:
+    """Human-readable position of a chunk within its file."""
+    if "slide" in metadata:
+        return f"Slide: {metadata['slide']}"
+    if "table" in metadata:
+        return f"Table: {metadata['table']}"
+    if metadata.get("section"):
+        return f"Section: {metadata['section']}"
+    return f"Page: {metadata.get('page', 'Unknown')}"
+
+def pack_context(docs: list, token_budget: int) -> tuple:
+    """Fill token_budget with the most relevant chunks, skipping overlapping and redundant text.
+
+    Returns (context, sources, tokens_used).
+    """
+    ranked = sorted(docs, key=lambda doc: doc.metadata.get("fusion_score", doc.metadata.get("similarity_score", 0.0)), reverse=True)
+    selected = {}  # filename -> texts already in the context
+    context_parts = []
+    sources = []
+    tokens_used = 0
+    for doc in ranked:
+        filename = doc.metadata.get("filename", "Unknown")
+        text = strip_overlap(doc.page_content, selected.get(filename, []))
+        if len(text.strip()) < 50:
+            continue
+        part = f"[Source: {filename}, {format_location(doc.metadata)}]\n{text}"
+        part_tokens = estimate_tokens(part)
+        if tokens_used + part_tokens > token_budget:
+            remaining_chars = (token_budget - tokens_used) * 4
+            if remaining_chars < 200:
+                break
+            part = part[:remaining_chars]  # Truncate the last chunk to what still fits
+            part_tokens = estimate_tokens(part)
+        context_parts.append(part)
+        selected.setdefault(filename, []).append(doc.page_content)
+        tokens_used += part_tokens
+        if filename not in sources:
+            sources.append(filename)
+    return "\n\n".join(context_parts), sources, tokens_used
+
+def history_within_budget(chat_history: list, token_budget: int) -> list:
+    """Most recent history lines (each truncated to 200 chars) that fit in token_budget, oldest first."""
+    lines = []
+    tokens_used = 0
+    for msg in reversed(chat_history[-6:]):
+        line = f"{msg['role'].capitalize()}: {msg['content'][:200]}..."
+        tokens_used += estimate_tokens(line)
+        if tokens_used > token_budget:
+            break
+        lines.append(line)
+    return list(reversed(lines))
+
 def create_dynamic_prompt(context: str, user_input: str, chat_history: list = None, file_sources: list = None) -> str:
     """Create dynamic prompt based on intent."""
     intent_data = detect_query_intent(user_input)
     intent = intent_data["intent"]
-    history_context = "\n\nPrevious context:\n" + "\n".join([f"{msg['role'].capitalize()}: {msg['content'][:200]}..." for msg in chat_history[-6:]]) if chat_history else ""
+    history_lines = history_within_budget(chat_history, HISTORY_TOKEN_BUDGET) if chat_history else []
+    history_context = "\n\nPrevious context:\n" + "\n".join(history_lines) if history_lines else ""
     sources_context = f"\n\nSources: {', '.join(file_sources)}" if file_sources else ""
     templates = {
         "summarize": f"Summarize the following:\n{context}\nUser: {user_input}{history_context}{sources_context}\nSummary:",
@@ -460,90 +564,146 @@ def create_dynamic_prompt(context: str, user_input: str, chat_history: list = No
     }
     return templates.get(intent, templates["general"])
 
-def get_relevant_context(user_input: str, k: int = 5) -> tuple:
-    """Get relevant context using vector similarity."""
+def get_relevant_context(vector_db: ChromaVectorDatabase, current_files: list, user_input: str, k: int = 8) -> tuple:
+    """Get relevant context using vector similarity, packed into CONTEXT_TOKEN_BUDGET."""
     try:
-        if st.session_state.current_files:
-            top_docs = st.session_state.vector_db.similarity_search(user_input, k=k)
+        if current_files:
+            top_docs = vector_db.similarity_search(user_input, k=k, mode=RETRIEVAL_MODE)
             if top_docs:
-                context_parts = []
-                sources = []
-                for doc in top_docs:
-                    filename = doc.metadata.get("filename", "Unknown")
-                    page = doc.metadata.get("page", "Unknown")
-                    context_parts.append(f"[Source: {filename}, Page: {page}]\n{doc.page_content}")
-                    if filename not in sources:
-                        sources.append(filename)
-                return "\n\n".join(context_parts), sources
+                context, sources, _ = pack_context(top_docs, CONTEXT_TOKEN_BUDGET)
+                return context, sources
             return "No relevant context found.", []
         return "No files uploaded.", []
     except Exception as e:
         logger.error(f"Error getting context: {str(e)}")
         return f"Error: {str(e)}", []
 
-def generate_response(user_input: str) -> tuple:
-    """Generate LLM response with context and memory."""
-    if not st.session_state.current_files and not st.session_state.loaded_chat:
+def build_chat_request(user_input: str, use_cache: bool = True) -> dict:
+    """Snapshot the session state generate_response needs, since it runs off the script thread."""
+    vector_db = st.session_state.vector_db
+    return {
+        "user": st.session_state.user,
+        "chat_id": st.session_state.chat_id,
+        # The session handle can switch chats mid-job, so the job opens its own on this collection
+        "vector_db": vector_db,
+        "collection_name": vector_db.collection_name,
+        "file_keys": dict(vector_db.file_keys),
+        "current_files": list(st.session_state.current_files),
+        "loaded_chat": st.session_state.loaded_chat,
+        "history": list(st.session_state.messages[-6:]),
+        "user_input": user_input,
+        "use_cache": use_cache
+    }
+
+def generate_response(request: dict, on_token=None, cancelled=None) -> tuple:
+    """Generate LLM response with context and memory from a build_chat_request snapshot."""
+    user_input, chat_id = request["user_input"], request["chat_id"]
+    if not request["current_files"] and not request["loaded_chat"]:
         return "Please upload a file or load a previous chat to enable chatting.", []
+    vector_db = request["vector_db"].open_collection(request["collection_name"], request["file_keys"])
+    intent = detect_query_intent(user_input)["intent"]
+    fingerprint = vector_db.documents_fingerprint()
+    query_embedding = None
+    # Answers are shared across users, so only those whose prompt carries no chat history are cached
+    # (the history snapshot ends with the question being asked)
+    if request["use_cache"] and fingerprint and len(request["history"]) <= 1:
+        query_embedding = vector_db.embed_query(user_input)
+        cached = get_answer_cache().get(fingerprint, intent, query_embedding)
+        if cached:
+            response, sources = cached
+            if on_token:
+                on_token(response)
+            logger.info(f"Answer cache hit for chat_id {chat_id}")
+            return response, sources
+    if request["loaded_chat"] and not vector_db.has_documents():
+        # The chat's index was garbage-collected (or predates persisted collections)
+        context, sources = "Using context from loaded chat history.", request["current_files"]
+    else:
+        context, sources = get_relevant_context(vector_db, request["current_files"], user_input)
+    prompt = create_dynamic_prompt(context, user_input, request["history"], sources)
+    response, metrics = stream_completion(client, prompt, on_token=on_token, cancelled=cancelled)
+    logger.info(f"LLM response for chat_id {chat_id}: {metrics}")
+    if query_embedding is not None and response:
+        get_answer_cache().put(fingerprint, intent, query_embedding, response, sources)
+    return response, sources
+
+def run_chat_turn(request: dict, on_token=None, cancelled=None) -> tuple:
+    """Answer one question and persist the exchange, unless it timed out; the executor job behind each chat turn."""
+    response, sources = generate_response(request, on_token=on_token, cancelled=cancelled)
+    if cancelled is not None and cancelled.is_set():
+        raise JobCancelledError("Chat turn timed out; answer discarded")
+    save_chat_history(request["user"], request["user_input"], response, request["chat_id"], sources)
+    log_user_activity(request["user"], "successful_query", f"chat_id: {request['chat_id']}")
+    return response, sources
+
+def submit_chat_turn(user_input: str, use_cache: bool = True):
+    """Queue a chat turn on the LLM executor as the session's pending turn."""
+    request = build_chat_request(user_input, use_cache)
+    partials = queue.Queue()
+    future = get_llm_executor().submit(request["user"], run_chat_turn, request, on_token=partials.put)
+    st.session_state.pending_turn = {"chat_id": request["chat_id"], "future": future, "partials": partials}
+
+def wait_for_turn(turn: dict, on_token) -> tuple:
+    """Relay a pending turn's streamed text to on_token until it finishes, and return its answer."""
+    future, partials = turn["future"], turn["partials"]
+    while True:
+        try:
+            partial_response = partials.get(timeout=STREAM_RENDER_INTERVAL)
+        except queue.Empty:
+            if future.done():
+                break
+            continue
+        while not partials.empty():  # Draw only the newest text if redraws fall behind
+            partial_response = partials.get_nowait()
+        on_token(partial_response)
     try:
-        context, sources = get_relevant_context(user_input) if not st.session_state.loaded_chat else ("", st.session_state.current_files)
-        if st.session_state.loaded_chat and not context:
-            context = "Using context from loaded chat history."
-        recent_history = st.session_state.messages[-6:] if st.session_state.messages else []
-        prompt = create_dynamic_prompt(context, user_input, recent_history, sources)
-        response = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.3,
-            max_tokens=1500
-        ).choices[0].message.content
-        return response, sources
+        return future.result()
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
         return f"Error: {str(e)}", []
 
+def show_pending_turn():
+    """Stream the pending turn's answer into the chat; a turn whose run was interrupted resumes here."""
+    turn = st.session_state.pending_turn
+    if turn is None:
+        return
+    if turn["chat_id"] != st.session_state.chat_id:
+        # The job still saves the turn to its own chat; it shows when that chat is loaded
+        st.session_state.pending_turn = None
+        return
+    response_placeholder = st.empty()
+    with response_placeholder:
+        show_typing_indicator()
+
+    def on_token(partial_response):
+        response_placeholder.markdown(render_chat_message({"role": "assistant", "content": partial_response}), unsafe_allow_html=True)
+
+    response, sources = wait_for_turn(turn, on_token)
+    assistant_message = {"role": "assistant", "content": response, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "sources": sources}
+    st.session_state.messages.append(assistant_message)
+    st.session_state.pending_turn = None
+    response_placeholder.markdown(render_chat_message(assistant_message), unsafe_allow_html=True)
+
 def display_chat_message(message: dict):
     """Display a chat message with timestamp and sources."""
-    role = message["role"]
-    content = message["content"]
-    timestamp = message.get("timestamp", "")
-    sources = message.get("sources", [])
-    formatted_time = format_timestamp(timestamp)
-    if role == "user":
-        st.markdown(f"""
-        <div class="user-message">
-            {content}
-            <div class="message-timestamp">{formatted_time}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        source_info = f'<div class="source-info">📎 Sources: {", ".join(sources)}</div>' if sources else ""
-        st.markdown(f"""
-        <div class="ai-message">
-            {content}
-            {source_info}
-            <div class="message-timestamp">{formatted_time}</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-def get_user_analytics(username: str) -> dict:
-    """Get user analytics using PostgreSQL."""
-    try:
-        conn = get_db_connection()  # Use the session connection
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM user_activity WHERE username = %s", (username,))
-        total_activities = c.fetchone()[0]
-        c.execute("SELECT COUNT(DISTINCT chat_id) FROM chat_history WHERE username = %s", (username,))
-        total_chats = c.fetchone()[0]
-        conn.commit()  # Ensure changes are committed if any
-        return {"total_activities": total_activities, "total_chats": total_chats}
-    except Exception as e:
-        logger.error(f"Error getting analytics: {str(e)}")
-        return {"total_activities": 0, "total_chats": 0}
+    st.markdown(render_chat_message(message), unsafe_allow_html=True)
+
+def display_chat_history():
+    """Draw the newest render_window messages, with a control to reveal or fetch older ones."""
+    messages = st.session_state.messages
+    hidden = max(0, len(messages) - st.session_state.render_window)
+    if hidden or st.session_state.history_has_more:
+        if st.button("⬆️ Show earlier messages", key="load_older_btn"):
+            if not hidden:
+                load_history_page()
+            st.session_state.render_window += HISTORY_PAGE_TURNS * 2
+            st.rerun()
+    st.markdown(render_messages_html(messages[hidden:]), unsafe_allow_html=True)
 
 def main_chat_page():
     """Main chat page with all enhancements."""
     load_css()
+    st.session_state.vector_db.use_namespace(st.session_state.user, st.session_state.chat_id)
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
         st.markdown('<div class="main-title">Welcome to PDF Chatbot</div>', unsafe_allow_html=True)
@@ -552,6 +712,8 @@ def main_chat_page():
     with col3:
         if st.button("🚪 Logout", key="logout_btn"):
             st.session_state.user = None
+            set_session_token(None)
+            st.session_state.pending_turn = None
             st.session_state.page = "login"
             st.rerun()
 
@@ -561,33 +723,44 @@ def main_chat_page():
             st.markdown(f'<div class="username-box">👤 Logged in as: {st.session_state.user}</div>', unsafe_allow_html=True)
 
         st.markdown("### 📁 Upload Files")
-        uploaded_files = st.file_uploader("Upload files", accept_multiple_files=True, key="file_uploader")
-        if uploaded_files:
+        # Keyed by chat, so a loaded or new chat starts with an empty uploader instead of the previous chat's files
+        uploaded_files = st.file_uploader("Upload files", accept_multiple_files=True, key=f"file_uploader_{st.session_state.chat_id}") or []
+        uploader_files = [file.name for file in uploaded_files]
+        if uploader_files != st.session_state.uploader_files:
             if any(file.size > 10 * 1024 * 1024 for file in uploaded_files):  # 10MB limit per file
                 st.error("One or more files exceed 10MB limit")
             else:
-                current_files_id = hash(tuple(file.name for file in uploaded_files))
-                if st.session_state.current_files_id != current_files_id:
-                    st.session_state.current_files = [file.name for file in uploaded_files]
-                    st.session_state.current_files_id = current_files_id
-                    st.session_state.vector_db.clear_database()
-                    all_docs = []
-                    for uploaded_file in uploaded_files:
-                        docs = process_attachment(uploaded_file)
-                        if docs:
-                            all_docs.extend(docs)
+                # Only new or changed files are ingested; files dropped from the uploader are removed
+                files_to_add, keys, filenames_to_remove = diff_files(st.session_state.vector_db, uploaded_files, st.session_state.uploader_files)
+                st.session_state.uploader_files = uploader_files
+                for filename in filenames_to_remove:
+                    st.session_state.vector_db.remove_file(filename)
+                if files_to_add:
+                    progress_bar = st.progress(0.0, text="Processing files...")
+                    file_status = {}
+
+                    def on_progress(filename, status):
+                        file_status[filename] = status
+                        finished = sum(1 for s in file_status.values() if s in ("cached", "done", "empty", "failed"))
+                        progress_bar.progress(finished / len(files_to_add), text=f"{filename}: {status}")
+
+                    results = ingest_files(st.session_state.vector_db, files_to_add, on_progress=on_progress, keys=keys)
+                    progress_bar.empty()
+                    for uploaded_file in files_to_add:
+                        if results.get(uploaded_file.name):
                             log_file_processing(st.session_state.user, uploaded_file.name, uploaded_file.size, "success")
-                    if all_docs:
-                        st.session_state.vector_db.add_documents(all_docs)
-                    st.success(f"✅ {len(uploaded_files)} file(s) processed!")
-                    log_user_activity(st.session_state.user, "file_upload", f"files: {len(uploaded_files)}")
-                    st.session_state.loaded_chat = False  # Reset loaded chat flag on new upload
+                st.session_state.current_files = list(dict.fromkeys([*st.session_state.vector_db.file_keys, *uploader_files]))
+                persist_chat_collection()
+                st.success(f"✅ {len(files_to_add)} file(s) processed, {len(filenames_to_remove)} removed!")
+                log_user_activity(st.session_state.user, "file_upload", f"files: {len(files_to_add)}, removed: {len(filenames_to_remove)}")
+                st.session_state.loaded_chat = False  # Reset loaded chat flag on new upload
 
         st.markdown("### 💬 Chat Management")
         chats = get_user_chats(st.session_state.user) if st.session_state.user else []
         if chats:
             options = [f"Chat {chat_id}" for chat_id in chats[:10]]
             selected_chat = st.selectbox("Select Chat", options, index=None, key="chat_selector")
+            st.selectbox("Export format", list(EXPORT_FORMATS), key="export_format")
             if selected_chat and not st.session_state.loaded_chat:
                 st.warning("⚠️ Please click 'Load Chat' to display the selected chat.")
             if selected_chat:
@@ -598,38 +771,75 @@ def main_chat_page():
                         export_chat_history()
                     if st.button("🗑️ Delete Chat", key="delete_chat_btn"):
                         delete_chat()
+            if st.button("📦 Export All Chats", key="export_all_btn"):
+                export_all_chats()
         if st.button("🆕 New Chat", key="new_chat_btn"):
             new_chat()
+        st.checkbox("🔄 Fresh answers (skip answer cache)", key="skip_answer_cache")
 
         st.markdown("### 📊 Analytics")
         analytics = get_user_analytics(st.session_state.user) if st.session_state.user else {"total_activities": 0, "total_chats": 0}
         st.markdown(f'<div class="stats-card"><div class="stats-number">{analytics["total_chats"]}</div>Total Chats</div>', unsafe_allow_html=True)
         st.markdown(f'<div class="stats-card"><div class="stats-number">{analytics["total_activities"]}</div>Total Activities</div>', unsafe_allow_html=True)
+        answer_cache_stats = get_answer_cache().get_stats()
+        st.markdown(f'<div class="stats-card"><div class="stats-number">{answer_cache_stats["llm_calls_saved"]}</div>LLM Calls Saved ({answer_cache_stats["answer_cache_hit_rate"]:.0%} cache hit rate)</div>', unsafe_allow_html=True)
+        pool_stats = get_db_pool_stats()
+        st.markdown(f'<div class="stats-card"><div class="stats-number">{pool_stats["in_use"]}/{pool_stats["max_size"]}</div>DB Connections in Use (peak {pool_stats["peak_in_use"]}, {pool_stats["waits"]} waits, {pool_stats["timeouts"]} timeouts, {pool_stats["reconnects"] + pool_stats["retries"]} reconnects)</div>', unsafe_allow_html=True)
 
-    st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-    for message in st.session_state.messages:
-        display_chat_message(message)
-    st.markdown('</div>', unsafe_allow_html=True)
+    display_chat_history()
+    show_pending_turn()
 
     if st.session_state.current_files or st.session_state.loaded_chat:
         user_input = st.chat_input("💬 Ask about the file...")
         if user_input:
             st.session_state.messages.append({"role": "user", "content": user_input, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")})
             display_chat_message(st.session_state.messages[-1])
-            typing_placeholder = st.empty()
-            with typing_placeholder:
-                show_typing_indicator()
-            response, sources = generate_response(user_input)
-            typing_placeholder.empty()
-            assistant_message = {"role": "assistant", "content": response, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "sources": sources}
-            st.session_state.messages.append(assistant_message)
-            display_chat_message(assistant_message)
-            save_chat_history(st.session_state.user, user_input, response, st.session_state.chat_id, sources)
-            log_user_activity(st.session_state.user, "successful_query", f"chat_id: {st.session_state.chat_id}")
+            submit_chat_turn(user_input, use_cache=not st.session_state.get("skip_answer_cache", False))
+            show_pending_turn()
             st.rerun()
     else:
         st.warning("⚠️ Please upload a file or load a previous chat to start chatting.")
 
+def client_ip() -> str:
+    """Best-effort client address for login throttling (None when unavailable)."""
+    try:
+        headers = st.context.headers
+    except AttributeError:  # Streamlit < 1.37
+        return None
+    return forwarded_client_ip(headers, getattr(st.context, "ip_address", None))  # ip_address: Streamlit >= 1.45
+
+def set_session_token(token: str):
+    """Store the session token in session state and in the URL's session query parameter (None clears both)."""
+    st.session_state.session_token = token
+    if token:
+        st.query_params["session"] = token
+    elif "session" in st.query_params:
+        del st.query_params["session"]
+
+def session_is_verified() -> bool:
+    """Check the session token (an HMAC, not bcrypt) and extend it while the user is active."""
+    if st.session_state.user and verify_session_token(st.session_state.session_token) == st.session_state.user:
+        set_session_token(issue_session_token(st.session_state.user))
+        return True
+    return False
+
+def start_session(username: str):
+    """Log username in to this browser session and open a new chat."""
+    st.session_state.user = username
+    set_session_token(issue_session_token(username))
+    st.session_state.page = "main"
+    st.session_state.chat_id = 1  # Reset chat ID
+    new_chat()  # Automatically start a new chat
+
+def restore_session():
+    """Log a new browser session (e.g. after a refresh) back in from a valid token in the URL, without bcrypt."""
+    username = verify_session_token(st.query_params.get("session"))
+    if username:
+        log_user_activity(username, "login", "session restored")
+        start_session(username)
+    else:
+        set_session_token(None)  # Expired or forged
+
 def login_page():
     """Login page."""
     load_css()
@@ -640,16 +850,15 @@ def login_page():
         password = st.text_input("🔒 Password", type="password", key="login_password")
         if st.button("🚀 Login", key="login_submit"):
             if username and password:
-                if login_user(username, password):
-                    st.session_state.user = username
-                    st.session_state.page = "main"
-                    st.session_state.messages = []  # Clear messages
-                    st.session_state.chat_id = 1  # Reset chat ID
-                    new_chat()  # Automatically start a new chat
+                try:
+                    authenticated = login_user(username, password, client_ip=client_ip())
+                except LoginThrottledError as e:
+                    st.error(f"⏳ Too many failed attempts. Try again in {e.retry_after:.0f} seconds.")
+                    log_user_activity(username, "login", "throttled")
+                    return
+                if authenticated:
                     log_user_activity(username, "login", "successful")
-                    st.success("✅ Login successful!")
-                    time.sleep(1)
-                    st.rerun()
+                    start_session(username)
                 else:
                     st.error("❌ Invalid credentials")
                     log_user_activity(username, "login", "failed")
@@ -689,14 +898,18 @@ def register_page():
             st.rerun()
 
 # Page routing
+if st.session_state.user is None and "session" in st.query_params:
+    restore_session()
 if st.session_state.page == "login":
     login_page()
 elif st.session_state.page == "register":
     register_page()
-elif st.session_state.page == "main" and st.session_state.user:
+elif st.session_state.page == "main" and session_is_verified():
     main_chat_page()
 else:
-    st.session_state.page = "login"  # Default to login page if not set
+    st.session_state.page = "login"  # Default to login page if not set (or the session token expired)
+    st.session_state.user = None
+    set_session_token(None)
     st.rerun()
 
 if "health" in st.query_params:
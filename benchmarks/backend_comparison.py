@@ -0,0 +1,76 @@
+"""Latency, throughput, memory and parity of each embedding backend.
+
+Each backend is measured in its own subprocess so that its RSS is not mixed
+with the others'. Reports model load time, RSS after load, single-query
+latency (p50/p99), chunk throughput and the minimum cosine similarity to the
+torch backend's vectors (must be >= EMBEDDING_PARITY_TOLERANCE).
+
+    python benchmarks/backend_comparison.py --backends torch torch-int8 onnx onnx-int8 --chunks 2000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from common import peak_rss_mb, percentile, synthetic_texts
+
+from embedding_backends import EMBEDDING_PARITY_TOLERANCE, PARITY_SAMPLE_TEXTS, load_embedding_model
+
+def measure(model_name: str, backend: str, chunks: int, queries: int) -> dict:
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    result = {"load_s": time.perf_counter() - start, "rss_after_load_mb": peak_rss_mb()}
+
+    texts = synthetic_texts(chunks)
+    model.encode(texts[:64], show_progress_bar=False)  # Warm up
+    latencies = []
+    for text in synthetic_texts(queries, max_words=30, seed=11):
+        start = time.perf_counter()
+        model.encode([text], show_progress_bar=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    result["query_p50_ms"] = percentile(latencies, 50)
+    result["query_p99_ms"] = percentile(latencies, 99)
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=64, show_progress_bar=False)
+    result["chunks_per_s"] = chunks / (time.perf_counter() - start)
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["vectors"] = np.asarray(model.encode(PARITY_SAMPLE_TEXTS, normalize_embeddings=True)).tolist()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.model, args.worker, args.chunks, args.queries)))
+        return
+
+    results = {}
+    for backend in args.backends:
+        command = [sys.executable, __file__, "--worker", backend, "--model", args.model,
+                   "--chunks", str(args.chunks), "--queries", str(args.queries)]
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode != 0:
+            print(f"{backend:<11} failed: {process.stderr.strip().splitlines()[-1] if process.stderr.strip() else process.returncode}")
+            continue
+        results[backend] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    reference = np.asarray(results["torch"]["vectors"]) if "torch" in results else None
+    print(f"{'backend':<11} {'load s':>7} {'RSS MB':>7} {'peak MB':>8} {'q p50 ms':>9} {'q p99 ms':>9} {'chunks/s':>9} {'min cos':>8}")
+    for backend, result in results.items():
+        parity = "n/a" if reference is None else f"{np.min(np.sum(reference * np.asarray(result['vectors']), axis=1)):.4f}"
+        print(f"{backend:<11} {result['load_s']:7.1f} {result['rss_after_load_mb']:7.0f} {result['peak_rss_mb']:8.0f} "
+              f"{result['query_p50_ms']:9.1f} {result['query_p99_ms']:9.1f} {result['chunks_per_s']:9.1f} {parity:>8}")
+    print(f"parity tolerance: {EMBEDDING_PARITY_TOLERANCE}")
+
+if __name__ == "__main__":
+    main()
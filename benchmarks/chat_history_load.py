@@ -0,0 +1,78 @@
+"""Loading and redrawing a long chat: full history vs keyset pages and cached HTML.
+
+Seeds one chat with --turns turns in the database at DATABASE_URL (the
+schema is migrated first), then times:
+  - get_chat_history for the whole chat vs one limit=HISTORY_PAGE_TURNS page
+  - a rerun that rebuilds every bubble's HTML (the old display) vs one that
+    joins the cached HTML of the newest CHAT_RENDER_WINDOW messages
+The seeded rows are deleted afterwards.
+
+    DATABASE_URL=postgresql://... python benchmarks/chat_history_load.py --turns 5000
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from common import synthetic_texts
+
+from psycopg2.extras import Json, execute_values
+
+from chat_view import CHAT_RENDER_WINDOW, HISTORY_PAGE_TURNS, history_to_messages, render_chat_message, render_messages_html
+from utils import delete_chat_history, get_chat_history, get_db_connection, init_database, init_db_pool
+
+def timed(label: str, fn, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<52} median {statistics.median(times):9.1f} ms   max {max(times):9.1f} ms")
+    return result
+
+def seed(username: str, chat_id: int, turns: int):
+    texts = synthetic_texts(turns * 2, min_words=10, max_words=120)
+    start = datetime.now(timezone.utc) - timedelta(seconds=turns)
+    rows = [(username, chat_id, start + timedelta(seconds=i), texts[2 * i], texts[2 * i + 1], Json(["report.pdf"]))
+            for i in range(turns)]
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        execute_values(c, "INSERT INTO chat_history (username, chat_id, timestamp, user_message, bot_response, file_sources) VALUES %s",
+                       rows, page_size=1000)
+        conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    init_db_pool(os.environ["DATABASE_URL"])
+    init_database()
+    username, chat_id = f"bench_{uuid.uuid4().hex[:8]}", 1
+    seed(username, chat_id, args.turns)
+    try:
+        print(f"chat with {args.turns} turns ({args.turns * 2} messages)")
+        full = timed("load: get_chat_history (all turns)", lambda: get_chat_history(username, chat_id), args.repeats)
+        page = timed(f"load: get_chat_history (limit={HISTORY_PAGE_TURNS}, keyset)",
+                     lambda: get_chat_history(username, chat_id, limit=HISTORY_PAGE_TURNS), args.repeats)
+
+        all_messages = history_to_messages(full)
+        timed("rerun: render every bubble (old display)",
+              lambda: "".join(render_chat_message(message) for message in all_messages), args.repeats)
+
+        def first_draw():
+            messages = history_to_messages(page)
+            render_messages_html(messages)
+            return messages
+
+        page_messages = timed("first draw: history_to_messages + build page HTML", first_draw, args.repeats)
+        timed(f"rerun: join cached HTML (newest {CHAT_RENDER_WINDOW} messages)",
+              lambda: render_messages_html(page_messages[-CHAT_RENDER_WINDOW:]), args.repeats)
+    finally:
+        delete_chat_history(username, chat_id)
+
+if __name__ == "__main__":
+    main()
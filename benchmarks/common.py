@@ -0,0 +1,29 @@
+import os
+import random
+import resource
+import sys
+from typing import List
+
+# Benchmarks run as scripts from the repo root: python benchmarks/<name>.py
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+WORDS = ("pump", "valve", "pressure", "clause", "retention", "report", "quarterly", "annual", "service",
+         "recertification", "inspection", "operator", "hours", "schedule", "maintenance", "policy", "data")
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB (Linux reports ru_maxrss in KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def synthetic_texts(count: int, min_words: int = 20, max_words: int = 200, seed: int = 7) -> List[str]:
+    """Deterministic pseudo-document chunks of varying length."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) + f" ref-{i}" for i in range(count)]
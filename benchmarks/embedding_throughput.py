@@ -0,0 +1,70 @@
+"""Embedding throughput: fixed vs adaptive batch sizes, in-process vs the shared worker pool.
+
+Also encodes from several threads at once on the shared pool (as concurrent
+uploads do) and checks every caller got the vectors for its own texts.
+
+    EMBED_WORKERS=4 python benchmarks/embedding_throughput.py --chunks 4000 --sessions 3
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from common import peak_rss_mb, synthetic_texts
+
+from database import EMBED_WORKERS, adaptive_batch_size, encode_on_pool, get_embedding_model, get_encode_pool
+
+def timed(label: str, count: int, encode):
+    start = time.perf_counter()
+    embeddings = encode()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {count / elapsed:8.1f} chunks/s  ({elapsed:.2f}s)")
+    return np.asarray(embeddings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--sessions", type=int, default=3, help="threads encoding on the shared pool at once")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    model = get_embedding_model(args.model)
+    texts = synthetic_texts(args.chunks)
+    batch_size = adaptive_batch_size(texts, model.max_seq_length)
+    model.encode(texts[:64], show_progress_bar=False)  # Warm up
+
+    reference = timed("in-process, batch_size=32", len(texts), lambda: model.encode(texts, batch_size=32, show_progress_bar=False))
+    timed(f"in-process, adaptive ({batch_size})", len(texts), lambda: model.encode(texts, batch_size=batch_size, show_progress_bar=False))
+
+    pool = get_encode_pool(args.model)
+    if pool is None:
+        print(f"EMBED_WORKERS={EMBED_WORKERS}: set EMBED_WORKERS >= 2 to benchmark the worker pool")
+    else:
+        pooled = timed(f"pool x{EMBED_WORKERS}, adaptive ({batch_size})", len(texts),
+                       lambda: encode_on_pool(model, pool, texts, batch_size, args.model))
+        print(f"  max abs diff vs in-process: {np.abs(pooled - reference).max():.2e}")
+
+        shares = [texts[i::args.sessions] for i in range(args.sessions)]
+        results = [None] * args.sessions
+
+        def session(index: int):
+            results[index] = encode_on_pool(model, pool, shares[index], batch_size, args.model)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(args.sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f"{f'{args.sessions} concurrent sessions on pool':<34} {len(texts) / elapsed:8.1f} chunks/s  ({elapsed:.2f}s)")
+        for index, embeddings in enumerate(results):
+            expected = reference[index::args.sessions]
+            similarity = np.sum(embeddings * expected, axis=1) / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(expected, axis=1))
+            status = "ok" if similarity.min() > 0.999 else "MISMATCH"
+            print(f"  session {index}: {len(embeddings)} vectors, min cosine vs in-process {similarity.min():.5f} [{status}]")
+    print(f"peak RSS: {peak_rss_mb():.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Chat-turn latency under load, against a local fake LLM server.
+
+Starts an OpenAI/Groq-compatible streaming endpoint that answers after a
+fixed time-to-first-token and then emits tokens at a fixed rate. Then
+simulates concurrent users, each sending several chat turns through the
+LLM executor with the real Groq client and stream_completion. Reports p50
+and p99 latency, time to first token, throughput, and the peak number of
+requests the server saw at once, which must not exceed the concurrency limit.
+
+    python benchmarks/llm_load.py --users 100 --turns 3 --concurrency 8
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import percentile
+
+from groq import Groq
+
+from completion import stream_completion
+from llm_executor import LLMRequestExecutor
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ttft: float, tokens: int, token_interval: float):
+        super().__init__(("127.0.0.1", 0), FakeLLMHandler)
+        self.ttft = ttft
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak_active = 0
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.active += 1
+            server.peak_active = max(server.peak_active, server.active)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            time.sleep(server.ttft)
+            for index in range(server.tokens):
+                self._event({"content": f"tok{index} "})
+                time.sleep(server.token_interval)
+            self._event({}, finish_reason="stop", usage={"prompt_tokens": 50, "completion_tokens": server.tokens,
+                                                         "total_tokens": 50 + server.tokens})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _event(self, delta: dict, finish_reason: str = None, usage: dict = None):
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "llama-3.1-8b-instant",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            chunk["x_groq"] = {"id": "req-fake", "usage": usage}
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM_MAX_CONCURRENCY for the executor")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake server time to first token (s)")
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.ttft, args.tokens, args.token_interval)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Groq(api_key="fake", base_url=f"http://127.0.0.1:{server.server_address[1]}", max_retries=0, timeout=60)
+    executor = LLMRequestExecutor(max_concurrency=args.concurrency, timeout=120)
+
+    latencies, ttfts, errors = [], [], []
+    lock = threading.Lock()
+
+    def user(index: int):
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            try:
+                _, metrics = executor.submit(f"user{index}", stream_completion, client, f"question {turn} from user {index}").result()
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                ttfts.append(metrics["ttft_ms"] / 1000)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    executor.close()
+    server.shutdown()
+
+    print(f"{args.users} users x {args.turns} turns, concurrency {args.concurrency}: {len(latencies)} ok, {len(errors)} failed in {elapsed:.1f}s")
+    print(f"turn latency  p50 {percentile(latencies, 50) * 1000:7.0f} ms   p99 {percentile(latencies, 99) * 1000:7.0f} ms")
+    print(f"ttft (server) p50 {percentile(ttfts, 50) * 1000:7.0f} ms   p99 {percentile(ttfts, 99) * 1000:7.0f} ms")
+    print(f"throughput    {len(latencies) / elapsed:.1f} turns/s; peak concurrent LLM requests {server.peak_active}")
+    if errors:
+        print(f"first error: {type(errors[0]).__name__}: {errors[0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Login storm: many sessions verifying passwords at once.
+
+Simulates a shift-start burst of concurrent logins, each verifying a bcrypt
+hash at BCRYPT_ROUNDS, either on the bounded auth pool (what
+login_user_base64 does) or inline on the session thread (the old
+behaviour). Meanwhile a heartbeat thread stands in for the other sessions'
+script runs and records how late its 10 ms ticks fire. Reports p50/p99
+login latency and heartbeat lag. The database lookup is left out.
+
+    python benchmarks/login_storm.py --logins 200 --concurrency 50
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from common import percentile
+
+from utils import AUTH_WORKERS, BCRYPT_ROUNDS, _hash_password, _verify_password, get_auth_pool
+
+def heartbeat(stop: threading.Event, lags: list, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        sum(range(2000))  # A little GIL-bound work, like a script rerun
+        time.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+def run(mode: str, stored_hash: str, logins: int, concurrency: int):
+    if mode == "pool":
+        verify = lambda: get_auth_pool().submit(_verify_password, "correct horse", stored_hash).result()
+    else:
+        verify = lambda: _verify_password("correct horse", stored_hash)
+
+    def login(_):
+        start = time.perf_counter()
+        matches, _ = verify()
+        assert matches
+        return (time.perf_counter() - start) * 1000
+
+    lags, stop = [], threading.Event()
+    ticker = threading.Thread(target=heartbeat, args=(stop, lags))
+    ticker.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as sessions:
+        latencies = list(sessions.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    ticker.join()
+    print(f"{mode:<7} {logins / elapsed:8.1f} logins/s   login p50 {percentile(latencies, 50):8.0f} ms  "
+          f"p99 {percentile(latencies, 99):8.0f} ms   heartbeat lag p50 {percentile(lags, 50):6.1f} ms  p99 {percentile(lags, 99):6.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="sessions logging in at once")
+    parser.add_argument("--modes", nargs="+", default=["pool", "inline"], choices=["pool", "inline"])
+    args = parser.parse_args()
+
+    stored_hash = _hash_password("correct horse")
+    start = time.perf_counter()
+    bcrypt.checkpw(b"correct horse", bcrypt.hashpw(b"correct horse", bcrypt.gensalt(BCRYPT_ROUNDS)))
+    print(f"BCRYPT_ROUNDS={BCRYPT_ROUNDS} (~{(time.perf_counter() - start) * 500:.0f} ms per check), AUTH_WORKERS={AUTH_WORKERS}")
+    for mode in args.modes:
+        run(mode, stored_hash, args.logins, args.concurrency)
+
+if __name__ == "__main__":
+    main()
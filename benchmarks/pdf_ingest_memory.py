@@ -0,0 +1,71 @@
+"""Peak memory of ingesting a large PDF through the app's extract, split, embed and store path.
+
+Builds a synthetic text PDF, extracts it with process_attachment_bytes (what
+the extraction workers run) and stores it with embed_and_store, which splits
+and encodes chunk_batch_size chunks at a time. Run it once per batch size:
+peak RSS should follow the batch size, not the page count.
+
+    python benchmarks/pdf_ingest_memory.py --pages 1000 --chunk-batch-size 256
+"""
+import argparse
+import tempfile
+import time
+
+from common import WORDS, peak_rss_mb
+
+from database import ChromaVectorDatabase
+from utils import process_attachment_bytes
+
+def synthetic_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    """A minimal valid PDF with pages pages of Helvetica text."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page in range(pages):
+        lines = [" ".join(WORDS[(page + line + word) % len(WORDS)] for word in range(12)) + f" p{page + 1}" for line in range(lines_per_page)]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 40 800 Td {text}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                       % len(objects))
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--chunk-batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pdfbot-bench-")
+    vector_db = ChromaVectorDatabase(persist_directory=f"{workdir}/chroma", cache_directory=f"{workdir}/cache",
+                                     chunk_batch_size=args.chunk_batch_size)
+    vector_db.use_namespace("bench", 1)
+    print(f"after model load            peak RSS {peak_rss_mb():7.0f} MB")
+
+    data = synthetic_pdf(args.pages)
+    print(f"synthetic PDF: {args.pages} pages, {len(data) / 2**20:.1f} MB")
+
+    start = time.perf_counter()
+    documents = process_attachment_bytes("bench.pdf", "application/pdf", data)
+    text_mb = sum(len(document.page_content) for document in documents) / 2**20
+    print(f"extracted {len(documents)} pages ({text_mb:.1f} MB of text) in {time.perf_counter() - start:.1f}s"
+          f"   peak RSS {peak_rss_mb():7.0f} MB")
+
+    start = time.perf_counter()
+    chunks = vector_db.embed_and_store(vector_db.file_cache_key(data), "bench.pdf", documents)
+    print(f"embedded and stored {chunks} chunks, {args.chunk_batch_size} per batch, in {time.perf_counter() - start:.1f}s"
+          f"   peak RSS {peak_rss_mb():7.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Retrieval recall@k and latency: vector-only vs hybrid (vector + BM25) search.
+
+Indexes synthetic texts carrying ref-{i} identifiers plus a set of templated
+facts, then asks two kinds of questions: the exact identifier of a text, and
+a reworded question about a fact. Reports, per mode and query kind, the share
+of queries with a chunk of their target text in the top k (long texts span
+several chunks), and p50/p99 similarity_search latency. Query embeddings are
+computed once up front, so both modes are timed on retrieval alone.
+
+    python benchmarks/retrieval_recall.py --chunks 5000 --queries 200 --k 8
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from common import percentile, synthetic_texts
+
+from langchain.docstore.document import Document
+
+from database import ChromaVectorDatabase
+
+COMPONENTS = ("centrifugal pump", "pressure relief valve", "backup generator", "cooling tower fan",
+              "fire suppression system", "air compressor", "boiler feed pump", "conveyor belt motor")
+SITES = ("Plant North", "the Riverside depot", "Warehouse 7", "the coastal terminal", "Site Delta")
+
+def facts():
+    """(fact chunk, reworded question) pairs, one per component and site."""
+    rng = random.Random(3)
+    pairs = []
+    for component in COMPONENTS:
+        for site in SITES:
+            hours = rng.choice((250, 500, 750, 1000, 2000))
+            pairs.append((f"The {component} at {site} must be inspected every {hours} operating hours by a certified technician.",
+                          f"How often does {site}'s {component} need a check-up?"))
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--chunks", type=int, default=5000, help="synthetic chunks with ref-{i} identifiers")
+    parser.add_argument("--queries", type=int, default=200, help="identifier queries (every fact is also asked)")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pdfbot-bench-")
+    vector_db = ChromaVectorDatabase(model_name=args.model, persist_directory=f"{workdir}/chroma", cache_directory=f"{workdir}/cache")
+    vector_db.use_namespace("bench", 1)
+    fact_pairs = facts()
+    documents = [Document(page_content=text, metadata={"filename": "bench.txt", "target": f"ref-{i}"})
+                 for i, text in enumerate(synthetic_texts(args.chunks))]
+    documents += [Document(page_content=fact, metadata={"filename": "bench.txt", "target": f"fact-{i}"})
+                  for i, (fact, _) in enumerate(fact_pairs)]
+    start = time.perf_counter()
+    vector_db.embed_and_store("bench", "bench.txt", documents)
+    print(f"indexed {vector_db.chunk_count()} chunks in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(5)
+    queries = {
+        "identifier": [(f"ref-{i}", f"ref-{i}") for i in rng.sample(range(args.chunks), min(args.queries, args.chunks))],
+        "paraphrase": [(question, f"fact-{i}") for i, (_, question) in enumerate(fact_pairs)],
+    }
+    vector_db.embed_queries([query for pairs in queries.values() for query, _ in pairs])
+
+    print(f"{'mode':<7} {'queries':<11} {f'recall@{args.k}':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in ("vector", "hybrid"):
+        for kind, pairs in queries.items():
+            hits, latencies = 0, []
+            for query, target in pairs:
+                start = time.perf_counter()
+                docs = vector_db.similarity_search(query, k=args.k, mode=mode)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += any(doc.metadata.get("target") == target for doc in docs)
+            print(f"{mode:<7} {kind:<11} {hits / len(pairs):9.2f} {percentile(latencies, 50):8.1f} {percentile(latencies, 99):8.1f}")
+
+if __name__ == "__main__":
+    main()
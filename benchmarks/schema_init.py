@@ -0,0 +1,53 @@
+"""Per-rerun cost of schema setup: inline DDL vs the versioned fast path.
+
+Against the database at DATABASE_URL (migrated first), times:
+  - the old per-rerun path: the base schema's CREATE TABLE IF NOT EXISTS and
+    information_schema checks (migration 1), run inline and rolled back
+  - init_database in a fresh process: one schema_version lookup
+  - init_database on every later rerun: the in-process _schema_ready check
+
+    DATABASE_URL=postgresql://... python benchmarks/schema_init.py --reruns 200
+"""
+import argparse
+import os
+import time
+
+from common import percentile
+
+import utils
+from utils import SCHEMA_MIGRATIONS, get_db_connection, init_database, init_db_pool
+
+def timed(label: str, fn, reruns: int) -> float:
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    p50 = percentile(times, 50)
+    print(f"{label:<44} p50 {p50:8.3f} ms   p99 {percentile(times, 99):8.3f} ms")
+    return p50
+
+def inline_base_schema():
+    _, _, migrate_base_schema = SCHEMA_MIGRATIONS[0]
+    with get_db_connection() as conn:
+        migrate_base_schema(conn.cursor())
+        conn.rollback()  # Measure the round trips without touching the migrated schema
+
+def cold_init_database():
+    utils._schema_ready = False
+    init_database()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--reruns", type=int, default=200)
+    args = parser.parse_args()
+
+    init_db_pool(os.environ["DATABASE_URL"])
+    init_database()
+    old = timed("inline DDL (old, every rerun)", inline_base_schema, args.reruns)
+    timed("init_database, first call in a process", cold_init_database, args.reruns)
+    new = timed("init_database, later reruns", init_database, args.reruns)
+    print(f"saved per rerun: {old - new:.3f} ms")
+
+if __name__ == "__main__":
+    main()
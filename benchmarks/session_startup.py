@@ -0,0 +1,63 @@
+"""Per-session startup cost and memory with the shared embedding model and Chroma client.
+
+Creates several ChromaVectorDatabase handles, as concurrent Streamlit sessions
+do, and reports the time and RSS for the first (cold) handle and for each
+later one. It then runs queries and chunk encodes from many threads at once
+against the shared model, which must all succeed.
+
+    python benchmarks/session_startup.py --sessions 10 --threads 8
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from common import peak_rss_mb, synthetic_texts
+
+from langchain.docstore.document import Document
+
+from database import ChromaVectorDatabase
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pdfbot-bench-")
+    baseline = peak_rss_mb()
+    handles = []
+    for index in range(args.sessions):
+        start = time.perf_counter()
+        handles.append(ChromaVectorDatabase(persist_directory=f"{workdir}/chroma", cache_directory=f"{workdir}/cache"))
+        elapsed = time.perf_counter() - start
+        label = "first session (cold)" if index == 0 else f"session {index + 1}"
+        print(f"{label:<22} {elapsed * 1000:8.1f} ms   peak RSS {peak_rss_mb():7.0f} MB")
+    if args.sessions > 1:
+        print(f"RSS baseline {baseline:.0f} MB; later sessions add ~0 MB each because the model is shared")
+
+    texts = synthetic_texts(64)
+    failures = []
+
+    def worker(index: int):
+        handle = handles[index % len(handles)]
+        try:
+            for text in texts[index::args.threads]:
+                handle.embed_queries([f"{text} q{index}"])
+                handle.text_splitter.count_tokens(text)
+            handle._encode_chunks([Document(page_content=text, metadata={"filename": "bench.txt"}) for text in texts[:16]])
+        except Exception as e:
+            failures.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"{args.threads} threads encoding on the shared model: {len(failures)} failures in {time.perf_counter() - start:.2f}s")
+    if failures:
+        print(f"first failure: {type(failures[0]).__name__}: {failures[0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import time
+
+# Turns fetched per page when loading a chat, and messages drawn before "Show earlier messages"
+HISTORY_PAGE_TURNS = 50
+CHAT_RENDER_WINDOW = 100
+
+def format_timestamp(timestamp_str):
+    """Format timestamp for display."""
+    try:
+        if timestamp_str:
+            return time.strftime("%I:%M %p", time.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S"))
+        return ""
+    except:
+        return ""
+
+def history_to_messages(history: list) -> list:
+    """Turn chat_history rows into session messages."""
+    messages = []
+    for entry in history:
+        if entry['user_message']:
+            messages.append({
+                "role": "user",
+                "content": entry['user_message'],
+                "timestamp": entry['timestamp']
+            })
+        if entry['bot_response']:
+            messages.append({
+                "role": "assistant",
+                "content": entry['bot_response'],
+                "timestamp": entry['timestamp'],
+                "sources": entry.get('file_sources', [])
+            })
+    return messages
+
+def render_chat_message(message: dict) -> str:
+    """Build the HTML bubble for a chat message with timestamp and sources."""
+    role = message["role"]
+    content = message["content"]
+    timestamp = message.get("timestamp", "")
+    sources = message.get("sources", [])
+    formatted_time = format_timestamp(timestamp)
+    if role == "user":
+        return f"""
+        <div class="user-message">
+            {content}
+            <div class="message-timestamp">{formatted_time}</div>
+        </div>
+        """
+    source_info = f'<div class="source-info">📎 Sources: {", ".join(sources)}</div>' if sources else ""
+    return f"""
+        <div class="ai-message">
+            {content}
+            {source_info}
+            <div class="message-timestamp">{formatted_time}</div>
+        </div>
+        """
+
+def render_messages_html(messages: list) -> str:
+    """All messages as one chat container, building each bubble's HTML once and keeping it on the message."""
+    for message in messages:
+        if "html" not in message:
+            message["html"] = render_chat_message(message)
+    return '<div class="chat-container">' + "".join(message["html"] for message in messages) + '</div>'
@@ -0,0 +1,66 @@
+import logging
+import threading
+from typing import Any, Dict, List
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+class StructureAwareChunker:
+    """Splits extracted documents into chunks sized in embedding-model tokens.
+
+    Extractors emit one Document per structural unit (PDF page, DOCX section or
+    table, PPTX slide) tagged with a "source_type". Each unit is split with
+    separators suited to its format, so chunks never span units and never
+    exceed what the embedding model reads before truncating. Chunks keep the
+    unit's location metadata plus a "chunk_index" within the unit.
+    """
+
+    VERSION = 1  # Bump when splitting behaviour changes, to invalidate cached embeddings
+    SEPARATORS = {
+        "pdf": ["\n\n", "\n", ". ", " ", ""],
+        "docx": ["\n\n", "\n", ". ", " ", ""],
+        "pptx": ["\n\n", "\n", " ", ""],
+        "default": ["\n\n", "\n", " ", ""],
+    }
+
+    def __init__(self, tokenizer, chunk_tokens: int, overlap_tokens: int = 32, tokenizer_lock: threading.Lock = None):
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        # Fast tokenizers must not be used from several threads at once. Pass the lock of
+        # the model that owns the tokenizer, so chunking and encoding exclude each other.
+        self._lock = tokenizer_lock or threading.Lock()
+        self.splitters = {
+            source_type: RecursiveCharacterTextSplitter(
+                chunk_size=chunk_tokens,
+                chunk_overlap=overlap_tokens,
+                length_function=self.count_tokens,
+                separators=separators
+            )
+            for source_type, separators in self.SEPARATORS.items()
+        }
+
+    def count_tokens(self, text: str) -> int:
+        """Number of model tokens in text, including the special tokens added at encode time."""
+        with self._lock:
+            return len(self.tokenizer.encode(text))
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "splitter": "structure_aware",
+            "version": self.VERSION,
+            "chunk_tokens": self.chunk_tokens,
+            "overlap_tokens": self.overlap_tokens
+        }
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        for document in documents:
+            splitter = self.splitters.get(document.metadata.get("source_type"), self.splitters["default"])
+            for chunk_index, text in enumerate(splitter.split_text(document.page_content)):
+                metadata = dict(document.metadata)
+                metadata["chunk_index"] = chunk_index
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
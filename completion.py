@@ -0,0 +1,74 @@
+import time
+
+from llm_executor import JobCancelledError, NonRetryableError
+
+# Minimum seconds between redraws of a streaming response
+STREAM_RENDER_INTERVAL = 0.05
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about 4 characters per token for Llama models)."""
+    return (len(text) + 3) // 4
+
+def stream_completion(client, prompt: str, on_token=None, cancelled=None) -> tuple:
+    """Stream a Groq chat completion from client, calling on_token(partial_text) as text arrives.
+
+    Returns (text, metrics) where metrics holds time-to-first-token and tokens/sec.
+    Raises JobCancelledError, after closing the stream, once the optional
+    cancelled event is set.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    last_render = 0.0
+    response = ""
+    chunk_count = 0
+    completion_tokens = None
+    prompt_tokens = estimate_tokens(prompt)
+    stream = client.chat.completions.create(
+        messages=[{"role": "user", "content": prompt}],
+        model="llama-3.1-8b-instant",
+        temperature=0.3,
+        max_tokens=1500,
+        stream=True
+    )
+    try:
+        for chunk in stream:
+            if cancelled is not None and cancelled.is_set():
+                if hasattr(stream, "close"):
+                    stream.close()
+                raise JobCancelledError("Response stream cancelled")
+            # Groq reports token usage on the final chunk
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage is not None:
+                completion_tokens = usage.completion_tokens
+                prompt_tokens = usage.prompt_tokens
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            now = time.perf_counter()
+            if first_token_at is None:
+                first_token_at = now
+            response += delta
+            chunk_count += 1
+            if on_token and now - last_render >= STREAM_RENDER_INTERVAL:
+                on_token(response)
+                last_render = now
+    except JobCancelledError:
+        raise
+    except Exception as e:
+        if response:
+            # Part of the answer is already on screen; retrying would repeat it
+            raise NonRetryableError(f"Response stream interrupted: {str(e)}") from e
+        raise
+    if on_token:
+        on_token(response)
+    end = time.perf_counter()
+    tokens = completion_tokens or chunk_count
+    generation_time = end - (first_token_at or end)
+    metrics = {
+        "ttft_ms": round(((first_token_at or end) - start) * 1000),
+        "total_ms": round((end - start) * 1000),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": tokens,
+        "tokens_per_sec": round(tokens / generation_time, 1) if generation_time > 0 else 0.0
+    }
+    return response, metrics
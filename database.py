@@ -2,98 +2,480 @@ import sys
 __import__('pysqlite3')
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 import chromadb
-from chromadb.config import Settings
 from langchain.docstore.document import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
+from chunking import StructureAwareChunker
+from embedding_backends import EMBEDDING_BACKEND, MULTI_PROCESS_BACKENDS, load_embedding_model
+from embedding_cache import EmbeddingCache
+from lexical_index import LexicalIndex
+import atexit
+import copy
+import hashlib
 import logging
 import os
-from typing import List, Dict, Any
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Process-wide shared resources. Every Streamlit session runs in the same
+# interpreter, so the embedding model and Chroma client are loaded once and
+# handed out to each session's ChromaVectorDatabase handle.
+_shared_lock = threading.Lock()
+_shared_models: Dict[str, SentenceTransformer] = {}
+# One lock per shared model: its fast tokenizer raises "Already borrowed" when two
+# threads use it at once, so encode() and token counting take this lock
+_shared_model_locks: Dict[str, threading.Lock] = {}
+_shared_clients: Dict[str, Any] = {}
+_shared_caches: Dict[str, EmbeddingCache] = {}
+_shared_encode_pools: Dict[str, Dict[str, Any]] = {}
+# encode_multi_process numbers its chunks from 0 on every call and reads them back from
+# the pool's single output queue, so only one call per pool may be in flight
+_shared_encode_pool_locks: Dict[str, threading.Lock] = {}
+
+# Embedding throughput settings: EMBED_WORKERS >= 2 encodes on a pool of CPU worker
+# processes; batch sizes adapt to text length within the min/max bounds.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+EMBED_TOKENS_PER_BATCH = int(os.getenv("EMBED_TOKENS_PER_BATCH", "8192"))
+EMBED_MIN_BATCH_SIZE = 8
+EMBED_MAX_BATCH_SIZE = 256
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query embeddings keyed by (model name, backend, query text)."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, key: tuple, embedding: List[float]):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+_query_embeddings = QueryEmbeddingCache(int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")))
+
+def get_embedding_model(model_name: str = "all-MiniLM-L6-v2", backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    """Return the process-wide embedding model for model_name on backend, loading it on first use."""
+    key = f"{model_name}:{backend}"
+    model = _shared_models.get(key)
+    if model is not None:
+        return model
+    with _shared_lock:
+        model = _shared_models.get(key)
+        if model is None:
+            try:
+                model = load_embedding_model(model_name, backend)
+                logger.info(f"Loaded model: {model_name} ({backend} backend)")
+            except Exception as e:
+                logger.error(f"Failed to load model {model_name} ({backend} backend): {str(e)}")
+                raise
+            _shared_model_locks[key] = threading.Lock()
+            _shared_models[key] = model
+    return model
+
+def get_model_lock(model_name: str = "all-MiniLM-L6-v2", backend: str = EMBEDDING_BACKEND) -> threading.Lock:
+    """Return the lock guarding the shared model for model_name on backend (and its tokenizer)."""
+    get_embedding_model(model_name, backend)
+    return _shared_model_locks[f"{model_name}:{backend}"]
+
+def get_chroma_client(persist_directory: str = "chroma_db"):
+    """Return the process-wide Chroma client for persist_directory, creating it on first use."""
+    client = _shared_clients.get(persist_directory)
+    if client is not None:
+        return client
+    with _shared_lock:
+        client = _shared_clients.get(persist_directory)
+        if client is None:
+            # A persistent client, so chat collections survive restarts and can be reattached
+            client = chromadb.PersistentClient(path=persist_directory)
+            _shared_clients[persist_directory] = client
+            logger.info(f"Created Chroma client for {persist_directory}")
+    return client
+
+def get_encode_pool(model_name: str = "all-MiniLM-L6-v2", backend: str = EMBEDDING_BACKEND):
+    """Return the process-wide multi-process encode pool for model_name, or None when EMBED_WORKERS < 2
+    or the backend cannot run in sentence-transformers' worker processes.
+
+    Each worker process loads the model once and serves every session's encode requests,
+    one call at a time (see encode_on_pool).
+    """
+    if EMBED_WORKERS < 2 or backend not in MULTI_PROCESS_BACKENDS:
+        return None
+    key = f"{model_name}:{backend}"
+    pool = _shared_encode_pools.get(key)
+    if pool is not None:
+        return pool
+    model = get_embedding_model(model_name, backend)
+    with _shared_lock:
+        pool = _shared_encode_pools.get(key)
+        if pool is None:
+            pool = model.start_multi_process_pool(target_devices=["cpu"] * EMBED_WORKERS)
+            atexit.register(SentenceTransformer.stop_multi_process_pool, pool)
+            _shared_encode_pool_locks[key] = threading.Lock()
+            _shared_encode_pools[key] = pool
+            logger.info(f"Started {EMBED_WORKERS} embedding worker processes for {model_name}")
+    return pool
+
+def encode_on_pool(model: SentenceTransformer, pool: Dict[str, Any], texts: List[str], batch_size: int,
+                   model_name: str = "all-MiniLM-L6-v2", backend: str = EMBEDDING_BACKEND):
+    """Encode texts on the shared pool for model_name/backend, holding that pool's lock for the call."""
+    with _shared_encode_pool_locks[f"{model_name}:{backend}"]:
+        return model.encode_multi_process(texts, pool, batch_size=batch_size)
+
+def adaptive_batch_size(texts: List[str], max_seq_length: int) -> int:
+    """Pick an encode batch size that keeps roughly EMBED_TOKENS_PER_BATCH tokens per batch.
+
+    Short texts get large batches; texts near the model's max length get small ones.
+    """
+    if not texts:
+        return EMBED_MIN_BATCH_SIZE
+    avg_tokens = min(max_seq_length, sum(len(text) for text in texts) / len(texts) / 4 + 2)  # ~4 chars per token
+    return max(EMBED_MIN_BATCH_SIZE, min(EMBED_MAX_BATCH_SIZE, int(EMBED_TOKENS_PER_BATCH // avg_tokens)))
+
+def get_embedding_cache(cache_directory: str = "embedding_cache", max_size_mb: int = 512) -> EmbeddingCache:
+    """Return the process-wide EmbeddingCache for cache_directory, creating it on first use."""
+    cache = _shared_caches.get(cache_directory)
+    if cache is not None:
+        return cache
+    with _shared_lock:
+        cache = _shared_caches.get(cache_directory)
+        if cache is None:
+            cache = EmbeddingCache(cache_directory, max_size_mb=max_size_mb)
+            _shared_caches[cache_directory] = cache
+    return cache
+
 class ChromaVectorDatabase:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", persist_directory: str = "chroma_db"):
+    """Lightweight per-session handle over the shared embedding model and Chroma client."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", persist_directory: str = "chroma_db", backend: str = EMBEDDING_BACKEND,
+                 cache_directory: str = "embedding_cache", cache_size_mb: int = 512,
+                 chunk_batch_size: int = 256, chunk_tokens: int = None, chunk_overlap_tokens: int = 32):
         logger.info("Initializing ChromaVectorDatabase...")
-        try:
-            self.model = SentenceTransformer(model_name)
-            logger.info(f"Loaded model: {model_name}")
-        except Exception as e:
-            logger.error(f"Failed to load model {model_name}: {str(e)}")
-            raise
+        self.model_name = model_name
+        self.backend = backend
+        self.model = get_embedding_model(model_name, backend)
+        self.model_lock = get_model_lock(model_name, backend)
         self.persist_directory = persist_directory
-        self.client = chromadb.Client(Settings(persist_directory=persist_directory))
-        self.collection = self.client.get_or_create_collection(name="document_embeddings")
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+        self.client = get_chroma_client(persist_directory)
+        self.collection_name = "document_embeddings"
+        self._attach_collection()
+        self.file_keys: Dict[str, str] = {}  # filename -> embedding cache key of the files in the collection
+        # Chunks are sized to the model's max sequence length so nothing is silently truncated at encode time
+        self.text_splitter = StructureAwareChunker(
+            self.model.tokenizer,
+            chunk_tokens=chunk_tokens or self.model.max_seq_length,
+            overlap_tokens=chunk_overlap_tokens,
+            tokenizer_lock=self.model_lock
+        )
+        self.chunk_batch_size = chunk_batch_size
+        self.cache = get_embedding_cache(cache_directory, max_size_mb=cache_size_mb)
         logger.info("ChromaVectorDatabase initialized successfully!")
 
-    def add_documents(self, documents: List[Document]):
-        if not documents:
-            logger.warning("No documents to add")
+    def chunker_config(self) -> Dict[str, Any]:
+        """Settings that change the produced chunks; part of the embedding cache key."""
+        return self.text_splitter.config()
+
+    @staticmethod
+    def collection_name_for(username: str, chat_id: int) -> str:
+        """Build a Chroma-safe collection name for a user's chat."""
+        user_key = hashlib.sha1(username.encode("utf-8")).hexdigest()[:16]
+        return f"u_{user_key}_chat_{chat_id}"
+
+    def _lexical_index_path(self, collection_name: str) -> str:
+        return os.path.join(self.persist_directory, "lexical", f"{collection_name}.sqlite3")
+
+    def _attach_collection(self):
+        """Open the current namespace's collection and lexical index if they exist, without creating them.
+
+        Collections are only created by the first write (see _ensure_collection), so chats
+        that never receive a file leave nothing on disk.
+        """
+        try:
+            self.collection = self.client.get_collection(name=self.collection_name)
+        except Exception:  # Chroma raises ValueError or NotFoundError, depending on the version
+            self.collection = None
+        self.lexical_index = LexicalIndex(self._lexical_index_path(self.collection_name)) if self.collection is not None else None
+
+    def _ensure_collection(self):
+        if self.collection is None:
+            self.collection = self.client.get_or_create_collection(name=self.collection_name)
+            self.lexical_index = LexicalIndex(self._lexical_index_path(self.collection_name))
+            logger.info(f"Created collection {self.collection_name}")
+        return self.collection
+
+    def use_namespace(self, username: str, chat_id: int):
+        """Point this handle at the isolated collection for username/chat_id."""
+        name = self.collection_name_for(username, chat_id)
+        if name == self.collection_name:
             return
-        logger.info(f"Adding {len(documents)} documents...")
+        self.collection_name = name
+        self._attach_collection()
+        self.file_keys = {}
+        logger.info(f"Using collection {name} for chat_id: {chat_id}")
+
+    def open_collection(self, collection_name: str, file_keys: Dict[str, str]) -> "ChromaVectorDatabase":
+        """Return a separate handle on collection_name that shares this handle's model, client and caches."""
+        handle = copy.copy(self)
+        handle.collection_name = collection_name
+        handle.file_keys = dict(file_keys)
+        handle._attach_collection()
+        return handle
+
+    def chunk_count(self) -> int:
+        """Number of chunks in the current collection (0 when it has not been created)."""
+        return self.collection.count() if self.collection is not None else 0
+
+    def iter_embedded_batches(self, documents: Iterable[Document]) -> Iterator[Dict[str, Any]]:
+        """Split and encode a stream of documents, yielding batches of at most chunk_batch_size chunks.
+
+        Only one batch of chunks and embeddings is held in memory at a time.
+        """
+        pending = []
+        for document in documents:
+            pending.extend(self.text_splitter.split_documents([document]))
+            while len(pending) >= self.chunk_batch_size:
+                batch, pending = pending[:self.chunk_batch_size], pending[self.chunk_batch_size:]
+                yield self._encode_chunks(batch)
+        if pending:
+            yield self._encode_chunks(pending)
+
+    def _encode_chunks(self, chunks: List[Document]) -> Dict[str, Any]:
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        batch_size = adaptive_batch_size(texts, self.model.max_seq_length)
+        pool = get_encode_pool(self.model_name, self.backend)
+        if pool is not None and len(texts) >= 2 * batch_size:
+            embeddings = encode_on_pool(self.model, pool, texts, batch_size, self.model_name, self.backend).tolist()
+        else:
+            with self.model_lock:
+                embeddings = self.model.encode(texts, show_progress_bar=False, batch_size=batch_size).tolist()
+        return {"texts": texts, "metadatas": metadatas, "embeddings": embeddings}
+
+    def add_embeddings(self, texts: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]]):
+        """Write already-encoded chunks to the current collection."""
+        if not texts:
+            logger.warning("No chunks created")
+            return
+        ids = [uuid.uuid4().hex for _ in texts]
+        self._ensure_collection().add(
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas,
+            ids=ids
+        )
+        self.lexical_index.add(ids, texts, [meta.get("filename") for meta in metadatas])
+        logger.info(f"Added {len(texts)} chunks to ChromaDB")
+
+    def file_cache_key(self, file_bytes: bytes) -> str:
+        """Embedding cache key for file_bytes under this handle's chunker and model."""
+        return self.cache.make_key(file_bytes, self.chunker_config(), f"{self.model_name}:{self.backend}")
+
+    def embed_and_store(self, key: str, filename: str, documents: Iterable[Document]) -> int:
+        """Embed a stream of extracted documents batch by batch, writing each batch to the
+        collection and to the embedding cache under key. Returns the number of chunks stored.
+        """
+        total_chunks = 0
         try:
-            chunks = self.text_splitter.split_documents(documents)
-            logger.info(f"Split into {len(chunks)} chunks")
-            if not chunks:
-                logger.warning("No chunks created")
-                return
-            texts = [chunk.page_content for chunk in chunks]
-            metadata = [chunk.metadata for chunk in chunks]
-            embeddings = self.model.encode(texts, show_progress_bar=True, batch_size=32).tolist()
-            ids = [f"doc_{i}" for i in range(len(chunks))]
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadata,
-                ids=ids
-            )
-            logger.info(f"Added {len(chunks)} chunks to ChromaDB")
+            with self.cache.writer(key) as write_batch:
+                for batch in self.iter_embedded_batches(documents):
+                    write_batch(batch)
+                    self.add_embeddings(batch["texts"], batch["metadatas"], batch["embeddings"])
+                    total_chunks += len(batch["texts"])
+        except Exception as e:
+            logger.error(f"Failed to add documents for {filename}: {str(e)}")
+            raise
+        self.file_keys[filename] = key
+        logger.info(f"Embedded {total_chunks} chunks for {filename}")
+        return total_chunks
+
+    def add_cached_batches(self, key: str, filename: str, batches: Iterable[Dict[str, Any]]) -> int:
+        """Write cached chunk batches for a file to the collection. Returns the number of chunks stored."""
+        self.file_keys[filename] = key
+        total_chunks = 0
+        for batch in batches:
+            # The same bytes may be uploaded under a different name
+            metadatas = [{**meta, "filename": filename} for meta in batch["metadatas"]]
+            self.add_embeddings(batch["texts"], metadatas, batch["embeddings"])
+            total_chunks += len(batch["texts"])
+        return total_chunks
+
+    def remove_file(self, filename: str):
+        """Delete one file's chunks from the collection and lexical index, leaving other files untouched."""
+        try:
+            if self.collection is not None:
+                self.collection.delete(where={"filename": filename})
+                self.lexical_index.delete_filename(filename)
+            self.file_keys.pop(filename, None)
+            logger.info(f"Removed {filename} from collection {self.collection_name}")
         except Exception as e:
-            logger.error(f"Failed to add documents: {str(e)}")
+            logger.error(f"Failed to remove {filename}: {str(e)}")
             raise
 
-    def similarity_search(self, query: str, k: int = 5, threshold: float = 0.1) -> List[Document]:
-        if not self.collection.count():
+    def documents_fingerprint(self) -> str:
+        """Content fingerprint of the files in the collection ("" when none were ingested by this handle)."""
+        if not self.file_keys:
+            return ""
+        return hashlib.sha256("|".join(sorted(self.file_keys.values())).encode("utf-8")).hexdigest()
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Encode queries, reusing cached embeddings and encoding the rest in one forward pass."""
+        embeddings = {}
+        missing = []
+        for query in queries:
+            if query in embeddings or query in missing:
+                continue
+            cached = _query_embeddings.get((self.model_name, self.backend, query))
+            if cached is not None:
+                embeddings[query] = cached
+            else:
+                missing.append(query)
+        if missing:
+            with self.model_lock:
+                encoded = self.model.encode(missing, batch_size=32).tolist()
+            for query, embedding in zip(missing, encoded):
+                _query_embeddings.put((self.model_name, self.backend, query), embedding)
+                embeddings[query] = embedding
+        return [embeddings[query] for query in queries]
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
+
+    @staticmethod
+    def _to_documents(documents: List[str], metadatas: List[Dict[str, Any]], distances: List[float], threshold: float) -> List[Document]:
+        docs = []
+        for doc_content, meta, distance in zip(documents, metadatas, distances):
+            if distance < (1 - threshold):  # Convert similarity threshold to distance
+                meta_copy = meta.copy() if meta else {}
+                meta_copy["similarity_score"] = 1 - distance  # Convert distance to similarity
+                docs.append(Document(page_content=doc_content, metadata=meta_copy))
+        return docs
+
+    def similarity_search(self, query: str, k: int = 5, threshold: float = 0.1, mode: str = "vector") -> List[Document]:
+        """Return the k most relevant chunks for query.
+
+        mode="vector" uses embedding similarity only; mode="hybrid" fuses it with
+        BM25 over the lexical index using reciprocal rank fusion, so exact
+        identifiers are found even when their embeddings are not close.
+        """
+        if not self.chunk_count():
             logger.info("No documents in collection")
             return []
-        logger.info(f"Searching for query: '{query[:50]}...' (k={k})")
+        logger.info(f"Searching for query: '{query[:50]}...' (k={k}, mode={mode})")
         try:
-            query_embedding = self.model.encode([query]).tolist()
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=k
-            )
-            documents = results['documents'][0]
-            metadatas = results['metadatas'][0]
-            distances = results['distances'][0]
-            docs = []
-            for i, (doc_content, meta, distance) in enumerate(zip(documents, metadatas, distances)):
-                if distance < (1 - threshold):  # Convert similarity threshold to distance
-                    meta_copy = meta.copy() if meta else {}
-                    meta_copy["similarity_score"] = 1 - distance  # Convert distance to similarity
-                    docs.append(Document(page_content=doc_content, metadata=meta_copy))
+            if mode == "hybrid":
+                docs = self._hybrid_search(query, k, threshold)
+            else:
+                results = self.collection.query(
+                    query_embeddings=[self.embed_query(query)],
+                    n_results=k
+                )
+                docs = self._to_documents(results['documents'][0], results['metadatas'][0], results['distances'][0], threshold)
             logger.info(f"Found {len(docs)} relevant documents")
             return docs
         except Exception as e:
             logger.error(f"Failed to perform similarity search: {str(e)}")
             return []
 
-    def clear_database(self):
+    def _hybrid_search(self, query: str, k: int, threshold: float, candidates_per_k: int = 4, rrf_k: int = 60) -> List[Document]:
+        n_candidates = min(k * candidates_per_k, self.chunk_count())
+        query_embedding = self.embed_query(query)
+        results = self.collection.query(query_embeddings=[query_embedding], n_results=n_candidates)
+        candidates = {}
+        fused = {}
+        for rank, (chunk_id, doc_content, meta, distance) in enumerate(zip(results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0])):
+            if distance < (1 - threshold):
+                candidates[chunk_id] = (doc_content, meta, 1 - distance)
+                fused[chunk_id] = 1 / (rrf_k + rank + 1)
+        lexical_hits = self.lexical_index.search(query, k=n_candidates)
+        for rank, (chunk_id, _) in enumerate(lexical_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (rrf_k + rank + 1)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:k]
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in candidates]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for chunk_id, doc_content, meta, embedding in zip(fetched['ids'], fetched['documents'], fetched['metadatas'], fetched['embeddings']):
+                # Same scale as Chroma's default (squared L2) distance
+                distance = float(sum((a - b) ** 2 for a, b in zip(query_embedding, embedding)))
+                candidates[chunk_id] = (doc_content, meta, 1 - distance)
+        docs = []
+        for chunk_id in top_ids:
+            if chunk_id not in candidates:
+                continue  # Stale lexical entry with no vector behind it
+            doc_content, meta, similarity = candidates[chunk_id]
+            meta_copy = meta.copy() if meta else {}
+            meta_copy["similarity_score"] = similarity
+            meta_copy["fusion_score"] = fused[chunk_id]
+            docs.append(Document(page_content=doc_content, metadata=meta_copy))
+        return docs
+
+    def similarity_search_batch(self, queries: List[str], k: int = 5, threshold: float = 0.1) -> List[List[Document]]:
+        """Run several queries with one encode pass and one Chroma request; returns results per query."""
+        if not queries:
+            return []
+        if not self.chunk_count():
+            logger.info("No documents in collection")
+            return [[] for _ in queries]
+        logger.info(f"Searching for {len(queries)} queries (k={k})")
         try:
-            self.client.delete_collection(name="document_embeddings")
-            self.collection = self.client.get_or_create_collection(name="document_embeddings")
-            logger.info("Database cleared")
+            results = self.collection.query(
+                query_embeddings=self.embed_queries(queries),
+                n_results=k
+            )
+            return [
+                self._to_documents(documents, metadatas, distances, threshold)
+                for documents, metadatas, distances in zip(results['documents'], results['metadatas'], results['distances'])
+            ]
         except Exception as e:
-            logger.error(f"Failed to clear database: {str(e)}")
+            logger.error(f"Failed to perform batch similarity search: {str(e)}")
+            return [[] for _ in queries]
+
+    def clear_database(self):
+        """Delete the current chat's chunks; a new collection is created by the next upload."""
+        self.drop_collection(self.collection_name)
+
+    def drop_collection(self, collection_name: str):
+        """Delete a chat's collection and its lexical index (the current one, or another for garbage collection)."""
+        exists = True
+        if collection_name == self.collection_name:
+            exists = self.collection is not None
+            self.collection = None
+            self.lexical_index = None
+            self.file_keys = {}
+        if exists:
+            try:
+                self.client.delete_collection(name=collection_name)
+            except Exception as e:
+                logger.warning(f"Failed to delete collection {collection_name}: {str(e)}")
+        index_path = self._lexical_index_path(collection_name)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        if exists:
+            logger.info(f"Dropped collection {collection_name}")
+
+    def has_documents(self) -> bool:
+        return self.chunk_count() > 0
 
     def get_stats(self) -> Dict[str, Any]:
         stats = {
-            'total_documents': self.collection.count(),
-            'has_embeddings': self.collection.count() > 0,
-            'database_path': self.persist_directory
+            'total_documents': self.chunk_count(),
+            'has_embeddings': self.chunk_count() > 0,
+            'collection_name': self.collection_name,
+            'database_path': self.persist_directory,
+            **self.cache.get_stats()
         }
         try:
             if os.path.exists(self.persist_directory):
@@ -0,0 +1,87 @@
+import argparse
+import logging
+import os
+import sys
+from typing import Callable, Dict, List
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+# Which implementation computes embeddings: "torch" (default), "torch-int8",
+# "onnx" or "onnx-int8". All produce vectors compatible with "torch" within
+# EMBEDDING_PARITY_TOLERANCE cosine similarity, so existing collections keep working.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Quantized ONNX export shipped with the sentence-transformers models on the Hub
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_PARITY_TOLERANCE = float(os.getenv("EMBEDDING_PARITY_TOLERANCE", "0.98"))
+
+PARITY_SAMPLE_TEXTS = [
+    "Summarize the conclusions of the quarterly report.",
+    "Clause 4.2.1 requires annual recertification of part PN-4471.",
+    "The pump must be serviced every 500 operating hours.",
+    "What does the document say about data retention?",
+]
+
+def _load_torch(model_name: str) -> SentenceTransformer:
+    return SentenceTransformer(model_name)
+
+def _load_torch_int8(model_name: str) -> SentenceTransformer:
+    import torch
+    model = SentenceTransformer(model_name, device="cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def _load_onnx(model_name: str) -> SentenceTransformer:
+    # Requires sentence-transformers >= 3.2 with optimum[onnxruntime] installed
+    return SentenceTransformer(model_name, device="cpu", backend="onnx")
+
+def _load_onnx_int8(model_name: str) -> SentenceTransformer:
+    return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs={"file_name": EMBEDDING_ONNX_INT8_FILE})
+
+EMBEDDING_BACKENDS: Dict[str, Callable[[str], SentenceTransformer]] = {
+    "torch": _load_torch,
+    "torch-int8": _load_torch_int8,
+    "onnx": _load_onnx,
+    "onnx-int8": _load_onnx_int8,
+}
+
+# Backends whose models can be shipped to sentence-transformers' multi-process pool
+MULTI_PROCESS_BACKENDS = {"torch"}
+
+def register_embedding_backend(name: str, loader: Callable[[str], SentenceTransformer]):
+    """Add a backend; loader(model_name) must return an object with SentenceTransformer's encode API."""
+    EMBEDDING_BACKENDS[name] = loader
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Available: {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[backend](model_name)
+
+def check_backend_parity(model_name: str, backend: str, texts: List[str] = None,
+                         reference_backend: str = "torch") -> float:
+    """Return the minimum cosine similarity between backend and reference_backend embeddings.
+
+    Logs a warning when it falls below EMBEDDING_PARITY_TOLERANCE.
+    """
+    texts = texts or PARITY_SAMPLE_TEXTS
+    reference = load_embedding_model(model_name, reference_backend).encode(texts, normalize_embeddings=True)
+    candidate = load_embedding_model(model_name, backend).encode(texts, normalize_embeddings=True)
+    min_similarity = float(np.min(np.sum(np.asarray(reference) * np.asarray(candidate), axis=1)))
+    if min_similarity < EMBEDDING_PARITY_TOLERANCE:
+        logger.warning(f"Embedding backend {backend} diverges from {reference_backend}: min cosine {min_similarity:.4f}")
+    else:
+        logger.info(f"Embedding backend {backend} matches {reference_backend}: min cosine {min_similarity:.4f}")
+    return min_similarity
+
+if __name__ == "__main__":
+    # Run before switching a deployment's EMBEDDING_BACKEND: python embedding_backends.py onnx-int8
+    parser = argparse.ArgumentParser(description="Compare an embedding backend's vectors with the torch model's")
+    parser.add_argument("backend", choices=sorted(EMBEDDING_BACKENDS))
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--reference", default="torch", choices=sorted(EMBEDDING_BACKENDS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    similarity = check_backend_parity(args.model, args.backend, reference_backend=args.reference)
+    print(f"{args.backend} vs {args.reference}: min cosine {similarity:.4f} (tolerance {EMBEDDING_PARITY_TOLERANCE})")
+    sys.exit(0 if similarity >= EMBEDDING_PARITY_TOLERANCE else 1)
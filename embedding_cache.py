@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """On-disk, content-addressed cache of extracted text, chunks and embeddings.
+
+    Entries are keyed by a hash of the file bytes, the chunker configuration and
+    the embedding model name. Each entry is a file holding a stream of pickled
+    chunk batches, so entries are written and read back one batch at a time.
+    The file's mtime doubles as its last-access time so the oldest entries are
+    evicted first once the cache grows past max_size_mb.
+    """
+
+    def __init__(self, cache_directory: str = "embedding_cache", max_size_mb: int = 512):
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_bytes: bytes, chunker_config: Dict[str, Any], model_name: str) -> str:
+        """Build the cache key for a file under a given chunker config and model."""
+        digest = hashlib.sha256()
+        digest.update(file_bytes)
+        digest.update(json.dumps(chunker_config, sort_keys=True).encode("utf-8"))
+        digest.update(model_name.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Iterator[Dict[str, Any]]]:
+        """Return an iterator over the cached batches for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            os.utime(path, None)  # Mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return self._iter_batches(key, path)
+
+    def _iter_batches(self, key: str, path: str) -> Iterator[Dict[str, Any]]:
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    try:
+                        yield pickle.load(f)
+                    except EOFError:
+                        return
+        except FileNotFoundError:
+            logger.warning(f"Cache entry {key} was evicted while being read")
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self._remove(path)
+
+    @contextmanager
+    def writer(self, key: str) -> Iterator[Callable[[Dict[str, Any]], None]]:
+        """Context manager yielding a function that appends one batch to the entry for key.
+
+        The entry only becomes visible once the block exits without an exception.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        f = open(tmp_path, "wb")
+        try:
+            yield lambda batch: pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            f.close()
+            self._remove(tmp_path)
+            raise
+        f.close()
+        try:
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total_size = 0
+            for name in os.listdir(self.cache_directory):
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(self.cache_directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+            if total_size <= self.max_size_bytes:
+                return
+            for _, size, path in sorted(entries):
+                self._remove(path)
+                total_size -= size
+                logger.info(f"Evicted cache entry {os.path.basename(path)}")
+                if total_size <= self.max_size_bytes:
+                    break
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'cache_hits': hits,
+            'cache_misses': misses,
+            'cache_hit_rate': round(hits / total, 3) if total else 0.0
+        }
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime
+from typing import IO, Callable, Dict, Iterator, Optional, Tuple
+
+from utils import get_db_connection, _format_db_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip by the server-side export cursor
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "500"))
+
+def iter_chat_rows(username: str, chat_id: int = None) -> Iterator[tuple]:
+    """Yield (chat_id, timestamp, user_message, bot_response, file_sources) rows in chat and turn order.
+
+    Rows stream from a named (server-side) cursor EXPORT_FETCH_SIZE at a time,
+    so memory stays flat however long the chat is. With chat_id None, every
+    chat of the user is exported.
+    """
+    with get_db_connection() as conn:
+        c = conn.cursor(name=f"chat_export_{uuid.uuid4().hex}")
+        c.itersize = EXPORT_FETCH_SIZE
+        try:
+            if chat_id is None:
+                c.execute("SELECT chat_id, timestamp, user_message, bot_response, file_sources FROM chat_history WHERE username = %s ORDER BY chat_id, id",
+                          (username,))
+            else:
+                c.execute("SELECT chat_id, timestamp, user_message, bot_response, file_sources FROM chat_history WHERE username = %s AND chat_id = %s ORDER BY id",
+                          (username, chat_id))
+            for row in c:
+                yield row
+        finally:
+            c.close()
+            conn.rollback()  # End the read-only transaction the named cursor lived in
+
+def _txt_header(username: str, chat_id: int) -> str:
+    return f"Chat ID: {chat_id}\nUser: {username}\nExport Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+
+def _txt_turn(row: tuple) -> str:
+    _, timestamp, user_message, bot_response, file_sources = row
+    formatted_time = _format_db_timestamp(timestamp)
+    parts = []
+    if user_message:
+        parts.append(f"User: {user_message} [{formatted_time}]\n" + "-" * 50 + "\n")
+    if bot_response:
+        sources = f"Sources: {', '.join(file_sources)}\n" if file_sources else ""
+        parts.append(f"Assistant: {bot_response} [{formatted_time}]\n{sources}" + "-" * 50 + "\n")
+    return "".join(parts)
+
+def _jsonl_header(username: str, chat_id: int) -> str:
+    return ""
+
+def _jsonl_turn(row: tuple) -> str:
+    chat_id, timestamp, user_message, bot_response, file_sources = row
+    return json.dumps({
+        "chat_id": chat_id,
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "user_message": user_message,
+        "bot_response": bot_response,
+        "file_sources": file_sources or []
+    }, ensure_ascii=False) + "\n"
+
+def _md_header(username: str, chat_id: int) -> str:
+    return f"# Chat {chat_id}\n\n*User:* {username}  \n*Exported:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+
+def _md_turn(row: tuple) -> str:
+    _, timestamp, user_message, bot_response, file_sources = row
+    formatted_time = _format_db_timestamp(timestamp)
+    parts = []
+    if user_message:
+        parts.append(f"**User** ({formatted_time}):\n\n{user_message}\n\n")
+    if bot_response:
+        parts.append(f"**Assistant** ({formatted_time}):\n\n{bot_response}\n\n")
+        if file_sources:
+            parts.append(f"_Sources: {', '.join(file_sources)}_\n\n")
+    parts.append("---\n\n")
+    return "".join(parts)
+
+# format -> (file extension, mime type, header(username, chat_id), turn(row))
+EXPORT_FORMATS: Dict[str, Tuple[str, str, Callable[[str, int], str], Callable[[tuple], str]]] = {
+    "txt": ("txt", "text/plain", _txt_header, _txt_turn),
+    "jsonl": ("jsonl", "application/jsonl", _jsonl_header, _jsonl_turn),
+    "markdown": ("md", "text/markdown", _md_header, _md_turn),
+}
+
+def _export_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Available: {', '.join(EXPORT_FORMATS)}")
+    return EXPORT_FORMATS[fmt]
+
+def iter_chat_export(username: str, chat_id: int, fmt: str = "txt") -> Iterator[str]:
+    """Yield one chat's transcript in fmt, piece by piece."""
+    _, _, header, turn = _export_format(fmt)
+    yield header(username, chat_id)
+    for row in iter_chat_rows(username, chat_id):
+        yield turn(row)
+
+def write_chat_export(username: str, chat_id: int, fmt: str = "txt", fileobj: Optional[IO[bytes]] = None) -> IO[bytes]:
+    """Stream one chat's transcript into fileobj (a temporary file by default), rewound for reading."""
+    fileobj = fileobj or tempfile.TemporaryFile()
+    for piece in iter_chat_export(username, chat_id, fmt):
+        fileobj.write(piece.encode("utf-8"))
+    fileobj.seek(0)
+    return fileobj
+
+def write_all_chats_zip(username: str, fmt: str = "txt", fileobj: Optional[IO[bytes]] = None) -> IO[bytes]:
+    """Stream every chat of username into a zip with one transcript per chat, rewound for reading.
+
+    A single server-side cursor walks the user's history in chat order; each
+    chat's entry is compressed as its rows arrive.
+    """
+    extension, _, header, turn = _export_format(fmt)
+    fileobj = fileobj or tempfile.TemporaryFile()
+    chats = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        entry, current_chat = None, None
+        try:
+            for row in iter_chat_rows(username):
+                if row[0] != current_chat:
+                    if entry:
+                        entry.close()
+                    current_chat = row[0]
+                    entry = archive.open(f"chat_{current_chat}.{extension}", "w")
+                    entry.write(header(username, current_chat).encode("utf-8"))
+                    chats += 1
+                entry.write(turn(row).encode("utf-8"))
+        finally:
+            if entry:
+                entry.close()
+    logger.info(f"Exported {chats} chats for {username} as {fmt}")
+    fileobj.seek(0)
+    return fileobj
+
+def export_filename(chat_id: Optional[int], fmt: str) -> str:
+    extension = "zip" if chat_id is None else _export_format(fmt)[0]
+    label = "all_chats" if chat_id is None else f"chat_export_{chat_id}"
+    return f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+def export_mime(fmt: str) -> str:
+    return _export_format(fmt)[1]
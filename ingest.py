@@ -0,0 +1,116 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import EXTRACTION_WORKERS, process_attachment_bytes
+
+logger = logging.getLogger(__name__)
+
+# Extraction (PDF parsing, OCR) is CPU-bound, so it runs on a process pool shared
+# by every session. "spawn" keeps the torch/Chroma state of the app process out
+# of the workers.
+_pool_lock = threading.Lock()
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+def get_extraction_pool(max_workers: int = None) -> ProcessPoolExecutor:
+    """Return the process-wide extraction pool, creating it on first use."""
+    global _extraction_pool
+    with _pool_lock:
+        if _extraction_pool is None:
+            max_workers = max_workers or EXTRACTION_WORKERS
+            _extraction_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Started extraction pool with {max_workers} workers")
+        return _extraction_pool
+
+def _reset_extraction_pool(broken: ProcessPoolExecutor):
+    """Drop a pool that broke (e.g. a worker was OOM-killed) so the next caller starts a fresh one."""
+    global _extraction_pool
+    with _pool_lock:
+        if _extraction_pool is broken:
+            _extraction_pool = None
+            logger.warning("Extraction pool broke (a worker died); starting a new one")
+    broken.shutdown(wait=False)
+
+def submit_extraction(filename: str, file_type: str, data: bytes) -> Future:
+    """Queue process_attachment_bytes on the extraction pool, replacing the pool once if it is broken."""
+    pool = get_extraction_pool()
+    try:
+        return pool.submit(process_attachment_bytes, filename, file_type, data)
+    except BrokenProcessPool:
+        _reset_extraction_pool(pool)
+        return get_extraction_pool().submit(process_attachment_bytes, filename, file_type, data)
+
+def diff_files(vector_db, uploaded_files: List[Any], previous_filenames: List[str]) -> Tuple[List[Any], Dict[str, str], List[str]]:
+    """Compare the uploader's files with what the collection already holds.
+
+    Returns (files to ingest, their cache keys by filename, filenames to remove).
+    Only files that were in the uploader before (previous_filenames) and are gone
+    now are removed, so files the collection got elsewhere (e.g. a reloaded chat)
+    stay. A file whose content changed under the same name is both removed and
+    re-ingested.
+    """
+    keys = {uploaded_file.name: vector_db.file_cache_key(uploaded_file.getvalue()) for uploaded_file in uploaded_files}
+    to_add = [uploaded_file for uploaded_file in uploaded_files if vector_db.file_keys.get(uploaded_file.name) != keys[uploaded_file.name]]
+    to_remove = [filename for filename, key in vector_db.file_keys.items()
+                 if (filename in keys and keys[filename] != key) or (filename not in keys and filename in previous_filenames)]
+    return to_add, keys, to_remove
+
+def ingest_files(vector_db, uploaded_files: List[Any], on_progress: Callable[[str, str], None] = None,
+                 keys: Dict[str, str] = None) -> Dict[str, int]:
+    """Extract, embed and store uploaded files as a pipeline.
+
+    Cache hits are written immediately. Misses are extracted in parallel on the
+    extraction pool, and each file is embedded and written to Chroma, in batches
+    of vector_db.chunk_batch_size chunks, as soon as its extraction finishes,
+    while later files are still being parsed.
+    on_progress(filename, status) is called on the caller's thread. keys may
+    supply already computed cache keys by filename. If an extraction worker
+    dies, the pool is replaced and the affected files are extracted once more.
+
+    Returns the number of chunks stored per filename (0 for empty or failed files).
+    """
+    def report(filename: str, status: str):
+        if on_progress:
+            on_progress(filename, status)
+
+    results = {}
+    pending = {}
+    for uploaded_file in uploaded_files:
+        data = uploaded_file.getvalue()
+        key = keys[uploaded_file.name] if keys and uploaded_file.name in keys else vector_db.file_cache_key(data)
+        batches = vector_db.cache.get(key)
+        if batches is not None:
+            results[uploaded_file.name] = vector_db.add_cached_batches(key, uploaded_file.name, batches)
+            report(uploaded_file.name, "cached")
+            continue
+        future = submit_extraction(uploaded_file.name, uploaded_file.type, data)
+        pending[future] = (uploaded_file, key, False)
+        report(uploaded_file.name, "extracting")
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        future = next(iter(done))
+        uploaded_file, key, retried = pending.pop(future)
+        filename = uploaded_file.name
+        try:
+            documents = future.result()
+        except Exception as e:
+            # A dead worker fails every file queued on that pool; give each one more try on a fresh pool
+            if isinstance(e, BrokenProcessPool) and not retried:
+                pending[submit_extraction(filename, uploaded_file.type, uploaded_file.getvalue())] = (uploaded_file, key, True)
+                continue
+            logger.error(f"Extraction failed for {filename}: {str(e)}")
+            results[filename] = 0
+            report(filename, "failed")
+            continue
+        if not documents:
+            results[filename] = 0
+            report(filename, "empty")
+            continue
+        report(filename, "embedding")
+        results[filename] = vector_db.embed_and_store(key, filename, documents)
+        report(filename, "done")
+    return results
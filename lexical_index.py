@@ -0,0 +1,86 @@
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keep identifiers such as "ISO-9001", "3.2.1" or "A/B" whole, and also index their parts
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class LexicalIndex:
+    """BM25 inverted index over a collection's chunks, persisted in a SQLite file.
+
+    Chunks are added and removed incrementally alongside the Chroma vectors and
+    share their ids, so lexical and vector results can be fused.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (chunk_id TEXT PRIMARY KEY, length INTEGER NOT NULL, filename TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_term_idx ON postings (term)")
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk_idx ON postings (chunk_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS docs_filename_idx ON docs (filename)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, chunk_ids: List[str], texts: List[str], filenames: List[str]):
+        doc_rows, posting_rows = [], []
+        for chunk_id, text, filename in zip(chunk_ids, texts, filenames):
+            counts = Counter(tokenize(text))
+            doc_rows.append((chunk_id, sum(counts.values()), filename))
+            posting_rows.extend((term, chunk_id, tf) for term, tf in counts.items())
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO docs (chunk_id, length, filename) VALUES (?, ?, ?)", doc_rows)
+            conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", posting_rows)
+
+    def delete_filename(self, filename: str):
+        """Remove every chunk indexed for filename."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM docs WHERE filename = ?)", (filename,))
+            conn.execute("DELETE FROM docs WHERE filename = ?", (filename,))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to k (chunk_id, bm25_score) pairs, best first."""
+        terms = list(set(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._connect() as conn:
+            total_docs, total_length = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not total_docs:
+                return []
+            avg_length = total_length / total_docs
+            doc_freq = dict(conn.execute(f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", terms))
+            rows = conn.execute(
+                f"SELECT p.chunk_id, p.term, p.tf, d.length FROM postings p JOIN docs d ON d.chunk_id = p.chunk_id WHERE p.term IN ({placeholders})",
+                terms
+            ).fetchall()
+        scores: Dict[str, float] = {}
+        for chunk_id, term, tf, length in rows:
+            df = doc_freq.get(term, 0)
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
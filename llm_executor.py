@@ -0,0 +1,179 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import random
+import threading
+from collections import deque
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Outbound LLM requests in flight across every session in the process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Seconds one attempt (retrieval plus the streamed completion) may take
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+
+# Groq error classes worth retrying: connection failures, timeouts, 429s and 5xx
+_RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+class NonRetryableError(Exception):
+    """Raised by a job to fail immediately, e.g. once part of a streamed answer has been shown."""
+
+class JobCancelledError(NonRetryableError):
+    """Raised by a job that stopped because its cancelled event was set."""
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, NonRetryableError):
+        return False
+    return any(cls.__name__ in _RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+Job = Tuple[Callable[..., Any], tuple, dict, concurrent.futures.Future]
+
+class LLMRequestExecutor:
+    """Runs LLM jobs on an asyncio loop in a background thread, off the Streamlit script thread.
+
+    At most max_concurrency jobs run at once. Waiting jobs are queued per
+    user and dispatched round-robin across users, so one user submitting many
+    requests cannot starve the others. Each attempt is bounded by timeout
+    seconds and is not rerun once it times out; other retryable failures are
+    retried up to max_retries times with jittered exponential backoff. Jobs
+    are plain blocking callables run on a thread pool, and submit() returns a
+    concurrent.futures.Future.
+
+    Every job is called with a cancelled keyword argument, a threading.Event
+    that is set when the job times out. A thread cannot be interrupted, so
+    the job should check the event, stop early and discard its result; its
+    slot stays taken until it actually returns.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_REQUEST_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff: float = LLM_RETRY_BACKOFF):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # A slot is only released once its thread returns, so one thread per slot suffices
+        self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-job")
+        self._loop = asyncio.new_event_loop()
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._turns: Deque[str] = deque()
+        self._stats_lock = threading.Lock()
+        self.stats = {'llm_jobs_submitted': 0, 'llm_jobs_completed': 0, 'llm_jobs_failed': 0,
+                      'llm_retries': 0, 'llm_timeouts': 0, 'llm_in_flight': 0}
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-executor", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self):
+        # Created on the loop's own thread so they bind to it on every Python version
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = self._loop.create_task(self._dispatch())
+
+    def submit(self, username: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> concurrent.futures.Future:
+        """Queue fn(*args, **kwargs) for username and return a Future for its result."""
+        future = concurrent.futures.Future()
+        self._count('llm_jobs_submitted')
+        self._loop.call_soon_threadsafe(self._enqueue, username or "", (fn, args, kwargs, future))
+        return future
+
+    def _enqueue(self, username: str, job: Job):
+        if username not in self._queues:
+            self._queues[username] = deque()
+            self._turns.append(username)
+        self._queues[username].append(job)
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._turns:
+                await self._slots.acquire()
+                username = self._turns.popleft()
+                queue = self._queues[username]
+                job = queue.popleft()
+                if queue:
+                    self._turns.append(username)
+                else:
+                    del self._queues[username]
+                self._loop.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        fn, args, kwargs, future = job
+        self._count('llm_in_flight')
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            for attempt in range(self.max_retries + 1):
+                cancelled = threading.Event()
+                call = asyncio.wrap_future(self._threads.submit(partial(fn, *args, cancelled=cancelled, **kwargs)))
+                try:
+                    future.set_result(await asyncio.wait_for(asyncio.shield(call), self.timeout))
+                    self._count('llm_jobs_completed')
+                    return
+                except asyncio.TimeoutError:
+                    # Never rerun a timed-out job: it may still be streaming. Ask it to stop
+                    # and keep its slot until the thread returns.
+                    cancelled.set()
+                    self._count('llm_timeouts')
+                    self._count('llm_jobs_failed')
+                    future.set_exception(TimeoutError(f"LLM request timed out after {self.timeout:.0f}s"))
+                    try:
+                        await call
+                    except Exception as e:
+                        logger.info(f"Timed-out LLM job stopped: {type(e).__name__}: {str(e)}")
+                    return
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        self._count('llm_jobs_failed')
+                        future.set_exception(e)
+                        return
+                    delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                    logger.warning(f"LLM request failed ({type(e).__name__}: {str(e)}); retry {attempt + 1} in {delay:.2f}s")
+                    self._count('llm_retries')
+                    await asyncio.sleep(delay)
+        finally:
+            self._count('llm_in_flight', -1)
+            self._slots.release()
+
+    def close(self):
+        """Stop dispatching and shut the loop down; queued jobs that have not started are abandoned."""
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._threads.shutdown(wait=False)
+
+    async def _shutdown(self):
+        self._dispatcher.cancel()
+        try:
+            await self._dispatcher
+        except asyncio.CancelledError:
+            pass
+
+    def _count(self, name: str, delta: int = 1):
+        with self._stats_lock:
+            self.stats[name] += delta
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['llm_max_concurrency'] = self.max_concurrency
+        return stats
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_llm_executor() -> LLMRequestExecutor:
+    """Return the process-wide LLMRequestExecutor, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = LLMRequestExecutor()
+            logger.info(f"Started LLM executor with concurrency {_executor.max_concurrency}")
+    return _executor
@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from answer_cache import SemanticAnswerCache
+
+def test_hit_for_same_documents_and_near_identical_question():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.put("docs", "general", [1.0, 0.0], "answer", ["a.pdf"])
+    assert cache.get("docs", "general", [0.99, 0.01]) == ("answer", ["a.pdf"])
+
+def test_dissimilar_question_misses():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.put("docs", "general", [1.0, 0.0], "answer", [])
+    assert cache.get("docs", "general", [0.0, 1.0]) is None
+    assert cache.get_stats()["answer_cache_misses"] == 1
+
+def test_different_documents_or_intent_miss():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.put("docs", "general", [1.0, 0.0], "answer", [])
+    assert cache.get("other-docs", "general", [1.0, 0.0]) is None
+    assert cache.get("docs", "summarize", [1.0, 0.0]) is None
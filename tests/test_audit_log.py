@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+
+import pytest
+
+utils = pytest.importorskip("utils")
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, query, row):
+        if any(isinstance(value, str) and "\x00" in value for value in row):
+            raise ValueError("A string literal cannot contain NUL (0x00) characters.")
+        self.db.pending.append(row)
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.rows.extend(self.db.pending)
+        self.db.pending = []
+
+    def rollback(self):
+        self.db.pending = []
+
+class FakeDatabase:
+    def __init__(self):
+        self.rows, self.pending = [], []
+        self.down = False
+
+    @contextmanager
+    def connection(self):
+        if self.down:
+            raise utils.psycopg2.OperationalError("server closed the connection")
+        try:
+            yield FakeConnection(self)
+        finally:
+            self.pending = []  # The pool rolls back whatever was left uncommitted
+
+@pytest.fixture
+def db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(utils, "get_db_connection", database.connection)
+
+    def fake_execute_values(cursor, query, rows):
+        for row in rows:
+            cursor.execute(query, row)
+
+    monkeypatch.setattr(utils, "execute_values", fake_execute_values)
+    return database
+
+@pytest.fixture
+def buffer():
+    audit_buffer = utils.AuditLogBuffer(flush_size=1000, flush_interval=3600)
+    yield audit_buffer
+    audit_buffer._stopped = True
+    audit_buffer._wake.set()
+
+def test_bad_row_is_dropped_and_the_rest_are_written(db, buffer):
+    buffer.add("user_activity", ("alice", "login", None, None))
+    buffer.add("user_activity", ("bob", "query", "bad\x00byte", None))
+    buffer.add("user_activity", ("carol", "login", None, None))
+    buffer.flush()
+    assert [row[0] for row in db.rows] == ["alice", "carol"]
+    assert buffer.pending_count("user_activity", "bob") == 0
+
+def test_rows_are_kept_while_the_database_is_down(db, buffer):
+    db.down = True
+    buffer.add("user_activity", ("alice", "login", None, None))
+    buffer.flush()
+    assert buffer.pending_count("user_activity", "alice") == 1
+    db.down = False
+    buffer.flush()
+    assert [row[0] for row in db.rows] == ["alice"]
@@ -0,0 +1,60 @@
+import pytest
+
+utils = pytest.importorskip("utils")
+
+from utils import LoginThrottle, forwarded_client_ip, issue_session_token, verify_session_token
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(utils.time, "monotonic", fake)
+    return fake
+
+def test_username_is_blocked_after_max_failures_until_they_age_out(clock):
+    throttle = LoginThrottle(max_user_failures=3, max_ip_failures=100, window=60)
+    for _ in range(3):
+        throttle.record_failure("Alice", "10.0.0.1")
+    assert throttle.retry_after("alice") == pytest.approx(60)
+    clock.now += 61
+    assert throttle.retry_after("alice") == 0
+
+def test_success_clears_the_username_but_not_the_ip(clock):
+    throttle = LoginThrottle(max_user_failures=3, max_ip_failures=3, window=60)
+    for _ in range(3):
+        throttle.record_failure("alice", "10.0.0.1")
+    throttle.reset("alice")
+    assert throttle.retry_after("alice") == 0
+    assert throttle.retry_after("bob", "10.0.0.1") > 0
+
+def test_expired_keys_are_pruned(clock):
+    throttle = LoginThrottle(max_user_failures=5, max_ip_failures=5, window=60)
+    for index in range(1000):
+        throttle.record_failure(f"user{index}", f"10.0.{index // 256}.{index % 256}")
+    assert len(throttle) == 2000
+    clock.now += 61
+    throttle.record_failure("mallory", "10.9.9.9")
+    assert len(throttle) == 2
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    headers = {"X-Forwarded-For": "1.2.3.4"}
+    assert forwarded_client_ip(headers, "10.0.0.7", trusted_proxies=0) == "10.0.0.7"
+    assert forwarded_client_ip(headers, None, trusted_proxies=0) is None
+
+def test_forwarded_for_takes_the_entry_added_by_the_outermost_trusted_proxy():
+    headers = {"X-Forwarded-For": "6.6.6.6, 1.2.3.4, 10.0.0.2"}
+    assert forwarded_client_ip(headers, "10.0.0.3", trusted_proxies=1) == "10.0.0.2"
+    assert forwarded_client_ip(headers, "10.0.0.3", trusted_proxies=2) == "1.2.3.4"
+
+def test_session_token_round_trip_and_tampering():
+    token = issue_session_token("alice", ttl=60)
+    assert verify_session_token(token) == "alice"
+    assert verify_session_token(token[:-1] + ("0" if token[-1] != "0" else "1")) is None
+    assert verify_session_token(issue_session_token("alice", ttl=-1)) is None
+    assert verify_session_token(None) is None
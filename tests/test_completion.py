@@ -0,0 +1,82 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from completion import estimate_tokens, stream_completion
+from llm_executor import JobCancelledError, NonRetryableError
+
+def make_chunk(content=None, usage=None):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)] if content is not None else [],
+                           x_groq=SimpleNamespace(usage=usage) if usage else None)
+
+class FakeStreamingClient:
+    """Stands in for groq.Groq: chat.completions.create(stream=True) yields the given chunks."""
+
+    def __init__(self, chunks, delay=0.0, fail_after=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.fail_after = fail_after
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self._stream()
+
+    def _stream(self):
+        for index, chunk in enumerate(self.chunks):
+            if self.fail_after is not None and index == self.fail_after:
+                raise ConnectionError("stream reset")
+            time.sleep(self.delay)
+            yield chunk
+
+def test_streams_text_and_reports_metrics():
+    usage = SimpleNamespace(completion_tokens=3, prompt_tokens=11)
+    client = FakeStreamingClient([make_chunk("Hel"), make_chunk("lo"), make_chunk("!"), make_chunk(usage=usage)], delay=0.01)
+    partials = []
+    text, metrics = stream_completion(client, "prompt", on_token=partials.append)
+    assert text == "Hello!"
+    assert partials[-1] == "Hello!"
+    assert client.requests[0]["stream"] is True
+    assert metrics["completion_tokens"] == 3
+    assert metrics["prompt_tokens"] == 11
+    assert 0 < metrics["ttft_ms"] <= metrics["total_ms"]
+    assert metrics["tokens_per_sec"] > 0
+
+def test_redraws_are_throttled():
+    client = FakeStreamingClient([make_chunk("x") for _ in range(200)])
+    partials = []
+    text, metrics = stream_completion(client, "prompt", on_token=partials.append)
+    assert text == "x" * 200
+    assert len(partials) < 10  # Fast chunks are coalesced into a few redraws plus the final one
+    assert metrics["completion_tokens"] == 200  # Falls back to counting chunks without usage data
+
+def test_failure_before_any_text_is_retryable():
+    client = FakeStreamingClient([make_chunk("a")], fail_after=0)
+    with pytest.raises(ConnectionError):
+        stream_completion(client, "prompt")
+
+def test_failure_mid_stream_is_not_retried():
+    client = FakeStreamingClient([make_chunk("a"), make_chunk("b")], fail_after=1)
+    with pytest.raises(NonRetryableError):
+        stream_completion(client, "prompt")
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd" * 10) == 10
+
+def test_cancelled_stream_stops_and_raises():
+    client = FakeStreamingClient([make_chunk("x") for _ in range(50)], delay=0.01)
+    cancelled = threading.Event()
+    partials = []
+
+    def on_token(text):
+        partials.append(text)
+        cancelled.set()
+
+    with pytest.raises(JobCancelledError):
+        stream_completion(client, "prompt", on_token=on_token, cancelled=cancelled)
+    assert len(partials) == 1
@@ -0,0 +1,33 @@
+import pytest
+
+utils = pytest.importorskip("utils")
+
+import psycopg2
+
+def test_dropped_connection_is_retried_once():
+    calls = []
+
+    @utils._retry_on_disconnect
+    def read():
+        calls.append(1)
+        if len(calls) == 1:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        return "rows"
+
+    retries = utils.get_db_pool_stats()["retries"]
+    assert read() == "rows" and len(calls) == 2
+    assert utils.get_db_pool_stats()["retries"] == retries + 1
+
+def test_second_failure_and_other_errors_are_raised():
+    @utils._retry_on_disconnect
+    def always_down():
+        raise psycopg2.InterfaceError("connection already closed")
+
+    @utils._retry_on_disconnect
+    def bad_query():
+        raise psycopg2.ProgrammingError("syntax error")
+
+    with pytest.raises(psycopg2.InterfaceError):
+        always_down()
+    with pytest.raises(psycopg2.ProgrammingError):
+        bad_query()
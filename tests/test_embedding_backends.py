@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from embedding_backends import EMBEDDING_BACKENDS, EMBEDDING_PARITY_TOLERANCE, check_backend_parity, load_embedding_model
+
+MODEL = "all-MiniLM-L6-v2"
+
+class FakeModel:
+    def __init__(self, noise: float = 0.0):
+        self.noise = noise
+
+    def encode(self, texts, normalize_embeddings=False):
+        vectors = np.array([[len(text), text.count(" ") + 1, 1.0] for text in texts])
+        vectors[:, 2] += self.noise * np.arange(len(texts))
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    monkeypatch.setitem(EMBEDDING_BACKENDS, "fake", lambda model_name: FakeModel())
+    monkeypatch.setitem(EMBEDDING_BACKENDS, "fake-noisy", lambda model_name: FakeModel(noise=40.0))
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        load_embedding_model(MODEL, "tpu")
+
+def test_parity_of_identical_backends(fake_backends):
+    assert check_backend_parity(MODEL, "fake", reference_backend="fake") == pytest.approx(1.0)
+
+def test_parity_flags_a_diverging_backend(fake_backends, caplog):
+    similarity = check_backend_parity(MODEL, "fake-noisy", reference_backend="fake")
+    assert similarity < EMBEDDING_PARITY_TOLERANCE
+    assert "diverges" in caplog.text
+
+def _model_is_cached() -> bool:
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return False
+    return isinstance(try_to_load_from_cache(f"sentence-transformers/{MODEL}", "config.json"), str)
+
+@pytest.mark.skipif(not _model_is_cached(), reason=f"{MODEL} is not in the local Hugging Face cache")
+@pytest.mark.parametrize("backend", ["torch-int8", "onnx", "onnx-int8"])
+def test_backend_matches_torch_within_tolerance(backend):
+    if backend.startswith("onnx"):
+        pytest.importorskip("optimum.onnxruntime")
+    assert check_backend_parity(MODEL, backend) >= EMBEDDING_PARITY_TOLERANCE
@@ -0,0 +1,37 @@
+import pytest
+
+ingest = pytest.importorskip("ingest")
+
+class FakeUpload:
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.data = data
+
+    def getvalue(self) -> bytes:
+        return self.data
+
+class FakeVectorDatabase:
+    def __init__(self, file_keys):
+        self.file_keys = dict(file_keys)
+
+    def file_cache_key(self, data: bytes) -> str:
+        return data.decode()
+
+def test_only_new_or_changed_files_are_ingested():
+    vector_db = FakeVectorDatabase({"a.pdf": "A", "b.pdf": "B"})
+    uploads = [FakeUpload("a.pdf", b"A"), FakeUpload("b.pdf", b"B2"), FakeUpload("c.pdf", b"C")]
+    to_add, keys, to_remove = ingest.diff_files(vector_db, uploads, ["a.pdf", "b.pdf"])
+    assert [upload.name for upload in to_add] == ["b.pdf", "c.pdf"]
+    assert keys == {"a.pdf": "A", "b.pdf": "B2", "c.pdf": "C"}
+    assert to_remove == ["b.pdf"]
+
+def test_files_dropped_from_the_uploader_are_removed():
+    vector_db = FakeVectorDatabase({"a.pdf": "A", "b.pdf": "B"})
+    to_add, _, to_remove = ingest.diff_files(vector_db, [FakeUpload("a.pdf", b"A")], ["a.pdf", "b.pdf"])
+    assert to_add == [] and to_remove == ["b.pdf"]
+
+def test_files_of_a_reloaded_chat_are_kept():
+    vector_db = FakeVectorDatabase({"report.pdf": "R"})  # Reattached index, never in this uploader
+    to_add, _, to_remove = ingest.diff_files(vector_db, [FakeUpload("extra.pdf", b"X")], [])
+    assert [upload.name for upload in to_add] == ["extra.pdf"]
+    assert to_remove == []
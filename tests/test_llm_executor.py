@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from llm_executor import LLMRequestExecutor, NonRetryableError
+
+@pytest.fixture
+def make_executor():
+    executors = []
+
+    def make(**kwargs):
+        executors.append(LLMRequestExecutor(**kwargs))
+        return executors[-1]
+
+    yield make
+    for executor in executors:
+        executor.close()
+
+class RateLimitError(Exception):
+    """Named like groq's 429 error, which the executor retries."""
+
+def test_round_robin_across_users(make_executor):
+    executor = make_executor(max_concurrency=1, timeout=5)
+    gate = threading.Event()
+    order = []
+
+    def job(user, index, cancelled):
+        gate.wait(5)
+        order.append((user, index))
+
+    futures = [executor.submit("alice", job, "alice", i) for i in range(3)]
+    futures += [executor.submit("bob", job, "bob", i) for i in range(2)]
+    time.sleep(0.1)  # Let every job queue up behind the first one
+    gate.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert order == [("alice", 0), ("bob", 0), ("alice", 1), ("bob", 1), ("alice", 2)]
+
+def test_retryable_errors_are_retried_with_backoff(make_executor):
+    executor = make_executor(max_concurrency=2, timeout=5, max_retries=2, backoff=0.01)
+    attempts = []
+
+    def flaky(cancelled):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RateLimitError("429")
+        return "ok"
+
+    assert executor.submit("alice", flaky).result(timeout=5) == "ok"
+    assert len(attempts) == 3
+    assert executor.get_stats()["llm_retries"] == 2
+
+def test_non_retryable_errors_fail_immediately(make_executor):
+    executor = make_executor(max_concurrency=2, timeout=5, max_retries=2, backoff=0.01)
+    attempts = []
+
+    def broken(cancelled):
+        attempts.append(1)
+        raise NonRetryableError("half-streamed")
+
+    with pytest.raises(NonRetryableError):
+        executor.submit("alice", broken).result(timeout=5)
+    assert len(attempts) == 1
+
+def test_timeout_cancels_job_and_keeps_its_slot_until_it_returns(make_executor):
+    executor = make_executor(max_concurrency=1, timeout=0.2, max_retries=2)
+    saved = []
+    started = []
+
+    def slow(cancelled):
+        started.append(time.monotonic())
+        for _ in range(100):  # Checks its cancelled event the way stream_completion does
+            if cancelled.wait(0.05):
+                return None
+        saved.append("answer")
+
+    def quick(cancelled):
+        started.append(time.monotonic())
+        return "quick"
+
+    timed_out = executor.submit("alice", slow)
+    follow_up = executor.submit("bob", quick)
+    with pytest.raises(TimeoutError):
+        timed_out.result(timeout=5)
+    assert follow_up.result(timeout=5) == "quick"
+    assert saved == []  # The timed-out job saw the cancel and dropped its result
+    assert started[1] - started[0] >= 0.2  # bob only ran once alice's thread had returned
+    stats = executor.get_stats()
+    assert stats["llm_timeouts"] == 1 and stats["llm_in_flight"] == 0
+
+def test_concurrency_is_bounded(make_executor):
+    executor = make_executor(max_concurrency=3, timeout=5)
+    lock = threading.Lock()
+    running = [0, 0]  # current, peak
+
+    def job(cancelled):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    futures = [executor.submit(f"user{i % 7}", job) for i in range(30)]
+    for future in futures:
+        future.result(timeout=5)
+    assert running[1] == 3
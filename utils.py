@@ -1,16 +1,31 @@
 # utils.py
 import psycopg2
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import ast
+import atexit
+import hashlib
+import hmac
+import secrets
+import tempfile
+import threading
 import time
-from typing import List
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
 from PyPDF2 import PdfReader
 from langchain.docstore.document import Document
 import bcrypt
 import base64
+import functools
 import docx
 import pytesseract
 from PIL import Image
 import os
+import io
 from pdf2image import convert_from_path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import logging
 
 # Set up logging
@@ -22,43 +37,213 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 HAS_PDF2IMAGE = True  # Assuming pdf2image is installed as per the try-except block intent
+
+# Processes extracting uploads (PDF parsing, OCR) in parallel; see ingest.get_extraction_pool
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# OCR fallback settings for PDF pages without a text layer. Each extraction worker
+# runs its own Tesseract threads, so by default they split the cores between them.
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // EXTRACTION_WORKERS))))
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "150"))
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "30"))
+OCR_DOCUMENT_TIMEOUT = int(os.getenv("OCR_DOCUMENT_TIMEOUT", "300"))
+# Number of PDF pages extracted (and OCR'd) per window when streaming a PDF
+PDF_PAGE_WINDOW = int(os.getenv("PDF_PAGE_WINDOW", "32"))
+# Postgres connection pool shared by every session in the process
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", "30"))
+_db_pool = None
+_db_pool_slots = None
+_db_pool_lock = threading.Lock()
+_db_last_used = {}
+_db_pool_stats = {"max_size": 0, "in_use": 0, "peak_in_use": 0, "borrows": 0, "waits": 0, "timeouts": 0, "reconnects": 0, "retries": 0}
+# Rows read and rewritten per round trip by data-converting schema migrations
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+# Audit rows (user_activity, file_processing) are written behind the request path
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2"))
+# Seconds a user's cached chat list and activity count are trusted; this process's
+# writes update them immediately, the TTL bounds staleness from other processes
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+# Password hashing runs on a small dedicated pool so login storms cannot starve other sessions
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))
+# Failed logins tolerated per username and per client IP within AUTH_FAILURE_WINDOW seconds
+AUTH_MAX_USER_FAILURES = int(os.getenv("AUTH_MAX_USER_FAILURES", "5"))
+AUTH_MAX_IP_FAILURES = int(os.getenv("AUTH_MAX_IP_FAILURES", "20"))
+AUTH_FAILURE_WINDOW = float(os.getenv("AUTH_FAILURE_WINDOW", "300"))
+# Reverse proxies in front of the app that append the caller's address to X-Forwarded-For.
+# With 0 the header is client-controlled, so it is ignored and the socket peer address is used.
+AUTH_TRUSTED_PROXIES = int(os.getenv("AUTH_TRUSTED_PROXIES", "0"))
+# Lifetime of the signed token that marks a session as already authenticated
+SESSION_TOKEN_TTL = float(os.getenv("SESSION_TOKEN_TTL", "1800"))
+SESSION_TOKEN_SECRET = os.getenv("SESSION_TOKEN_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+_auth_pool = None
+
 try:
     from pptx import Presentation
 except ImportError:
     logging.warning("python-pptx not found. PPTX support will be limited.")
 
+def _contiguous_runs(page_numbers: List[int]) -> List[tuple]:
+    """Group sorted page numbers into (first, last) runs, each rasterized with a single poppler call."""
+    runs = []
+    for page_num in page_numbers:
+        if runs and page_num == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page_num)
+        else:
+            runs.append((page_num, page_num))
+    return runs
+
+def _ocr_image_file(image_path: str) -> str:
+    """OCR one rasterized page from disk, deleting the image afterwards."""
+    try:
+        return pytesseract.image_to_string(image_path, timeout=OCR_PAGE_TIMEOUT)
+    finally:
+        os.remove(image_path)
+
+def ocr_pdf_pages(pdf_path: str, page_numbers: List[int], dpi: int = OCR_DPI, deadline: float = None) -> Dict[int, str]:
+    """OCR the given 1-based pages of a PDF on disk, returning text per page number.
+
+    Each contiguous run of pages is rasterized by one poppler call into a
+    temporary folder, and Tesseract reads the page images from there on a thread
+    pool, so no page image is held in memory. At most OCR_MAX_PAGES pages are
+    processed, and work stops at deadline (time.monotonic() based,
+    OCR_DOCUMENT_TIMEOUT seconds from now by default).
+    """
+    if len(page_numbers) > OCR_MAX_PAGES:
+        logger.warning(f"OCR limited to {OCR_MAX_PAGES} of {len(page_numbers)} textless pages")
+        page_numbers = page_numbers[:OCR_MAX_PAGES]
+    if deadline is None:
+        deadline = time.monotonic() + OCR_DOCUMENT_TIMEOUT
+    texts = {}
+    in_flight = {}
+
+    def collect(done):
+        for future in done:
+            page_num = in_flight.pop(future)
+            try:
+                texts[page_num] = future.result()
+            except Exception as e:
+                logger.warning(f"OCR failed for page {page_num}: {e}")
+
+    with tempfile.TemporaryDirectory(prefix="pdfbot-ocr-") as image_dir, ThreadPoolExecutor(max_workers=OCR_WORKERS) as pool:
+        for first_page, last_page in _contiguous_runs(sorted(page_numbers)):
+            # Backpressure: only rasterize the next run once the previous one is mostly OCR'd
+            while len(in_flight) >= OCR_WORKERS and time.monotonic() < deadline:
+                done, _ = wait(in_flight, timeout=deadline - time.monotonic(), return_when=FIRST_COMPLETED)
+                collect(done)
+            if time.monotonic() >= deadline:
+                break
+            try:
+                image_paths = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                                output_folder=image_dir, output_file=f"run{first_page}", paths_only=True,
+                                                grayscale=True, thread_count=OCR_WORKERS,
+                                                timeout=max(1, int(deadline - time.monotonic())))
+            except Exception as e:
+                logger.warning(f"Rasterization failed for pages {first_page}-{last_page}: {e}")
+                continue
+            for offset, image_path in enumerate(image_paths):
+                in_flight[pool.submit(_ocr_image_file, image_path)] = first_page + offset
+        done, not_done = wait(in_flight, timeout=max(0, deadline - time.monotonic()))
+        collect(done)
+        for future in not_done:
+            future.cancel()
+    skipped = len(page_numbers) - len(texts)
+    if skipped:
+        logger.warning(f"OCR produced no text for {skipped} of {len(page_numbers)} page(s)")
+    return texts
+
+def iter_pdf_pages(uploaded_file) -> Iterator[Document]:
+    """Yield a Document per PDF page with text, extracting and OCR'ing PDF_PAGE_WINDOW pages at a time."""
+    data = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.read()
+    pdf_reader = PdfReader(io.BytesIO(data))
+    total_pages = len(pdf_reader.pages)
+    deadline = time.monotonic() + OCR_DOCUMENT_TIMEOUT
+    ocr_budget = OCR_MAX_PAGES
+    with tempfile.TemporaryDirectory(prefix="pdfbot-pdf-") as workdir:
+        pdf_path = None
+        for window_start in range(1, total_pages + 1, PDF_PAGE_WINDOW):
+            window = range(window_start, min(window_start + PDF_PAGE_WINDOW, total_pages + 1))
+            page_texts = {page_num: pdf_reader.pages[page_num - 1].extract_text() or "" for page_num in window}
+            textless_pages = [page_num for page_num, text in page_texts.items() if not text.strip()]
+            if textless_pages and HAS_PDF2IMAGE and ocr_budget > 0 and time.monotonic() < deadline:
+                if len(textless_pages) > ocr_budget:
+                    logger.warning(f"OCR page budget of {OCR_MAX_PAGES} exhausted for {uploaded_file.name}")
+                    textless_pages = textless_pages[:ocr_budget]
+                ocr_budget -= len(textless_pages)
+                if pdf_path is None:
+                    pdf_path = os.path.join(workdir, "document.pdf")
+                    with open(pdf_path, "wb") as f:
+                        f.write(data)
+                page_texts.update(ocr_pdf_pages(pdf_path, textless_pages, deadline=deadline))
+            for page_num, text in page_texts.items():
+                if text:
+                    yield Document(
+                        page_content=text,
+                        metadata={"page": page_num, "filename": uploaded_file.name, "source_type": "pdf"}
+                    )
+
 def process_pdf(uploaded_file) -> List[Document]:
     """Process a PDF file and return a list of Document objects."""
-    pdf_reader = PdfReader(uploaded_file)
+    return list(iter_pdf_pages(uploaded_file))
+
+def process_docx(uploaded_file) -> List[Document]:
+    """Process a DOCX file into one Document per heading-delimited section, plus one per table."""
+    doc = docx.Document(uploaded_file)
     documents = []
-    for page_num, page in enumerate(pdf_reader.pages):
-        text = page.extract_text()
-        if not text.strip() and HAS_PDF2IMAGE and os.path.exists(uploaded_file.name):
-            try:
-                images = convert_from_path(uploaded_file.name, first_page=page_num + 1, last_page=page_num + 1)
-                text = pytesseract.image_to_string(images[0]) if images else ""
-            except Exception as e:
-                logger.warning(f"OCR failed for page {page_num + 1}: {e}")
-                text = ""
+    heading, section_index, lines = "", 0, []
+
+    def flush_section():
+        text = "\n".join(lines)
+        if text.strip():
+            documents.append(Document(
+                page_content=text,
+                metadata={"filename": uploaded_file.name, "section": heading, "section_index": section_index, "source_type": "docx"}
+            ))
+
+    for paragraph in doc.paragraphs:
+        style_name = paragraph.style.name if paragraph.style is not None else ""
+        if style_name.startswith("Heading") or style_name == "Title":
+            flush_section()
+            heading, section_index, lines = paragraph.text.strip(), section_index + 1, [paragraph.text]
+        else:
+            lines.append(paragraph.text)
+    flush_section()
+    for table_index, table in enumerate(doc.tables, start=1):
+        rows = [" | ".join(cell.text.strip() for cell in row.cells) for row in table.rows]
+        text = "\n".join(row for row in rows if row.strip(" |"))
         if text:
             documents.append(Document(
                 page_content=text,
-                metadata={"page": page_num + 1, "filename": uploaded_file.name}
+                metadata={"filename": uploaded_file.name, "table": table_index, "source_type": "docx"}
             ))
     return documents
 
-def process_docx(uploaded_file) -> List[Document]:
-    """Process a DOCX file and return a list of Document objects."""
-    doc = docx.Document(uploaded_file)
-    text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-    return [Document(page_content=text, metadata={"filename": uploaded_file.name})]
+def _shape_text(shape) -> str:
+    if getattr(shape, "has_table", False) and shape.has_table:
+        return "\n".join(" | ".join(cell.text.strip() for cell in row.cells) for row in shape.table.rows)
+    if hasattr(shape, "text_frame") and shape.text_frame:
+        return shape.text
+    return ""
 
 def process_pptx(uploaded_file) -> List[Document]:
-    """Process a PPTX file and return a list of Document objects."""
+    """Process a PPTX file into one Document per slide."""
     try:
         ppt = Presentation(uploaded_file)
-        full_text = "\n".join([shape.text for slide in ppt.slides for shape in slide.shapes if hasattr(shape, "text_frame") and shape.text_frame])
-        return [Document(page_content=full_text, metadata={"filename": uploaded_file.name})]
+        documents = []
+        for slide_num, slide in enumerate(ppt.slides, start=1):
+            text = "\n".join(t for t in (_shape_text(shape) for shape in slide.shapes) if t)
+            if text.strip():
+                documents.append(Document(
+                    page_content=text,
+                    metadata={"filename": uploaded_file.name, "slide": slide_num, "source_type": "pptx"}
+                ))
+        return documents
     except Exception as e:
         logger.warning(f"PPTX processing failed: {e}")
         return []
@@ -80,12 +265,15 @@ def process_image(uploaded_file) -> List[Document]:
         logger.warning(f"Image OCR failed: {e}")
         return []
 
+def _is_pdf(uploaded_file) -> bool:
+    return uploaded_file.type.lower() == "application/pdf" or uploaded_file.name.lower().endswith('.pdf')
+
 def process_attachment(uploaded_file):
     """Process various file types and return a list of Document objects."""
     file_type = uploaded_file.type.lower()
     filename = uploaded_file.name.lower()
     
-    if file_type == "application/pdf" or filename.endswith('.pdf'):
+    if _is_pdf(uploaded_file):
         return process_pdf(uploaded_file)
     elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" or filename.endswith('.docx'):
         return process_docx(uploaded_file)
@@ -99,22 +287,111 @@ def process_attachment(uploaded_file):
         logger.warning(f"Unsupported file type: {file_type} ({filename})")
         return []
 
+def process_attachment_bytes(filename: str, file_type: str, data: bytes) -> List[Document]:
+    """Process raw file bytes; picklable entry point for extraction worker processes."""
+    buffer = io.BytesIO(data)
+    buffer.name = filename
+    buffer.type = file_type
+    return process_attachment(buffer)
+
+def init_db_pool(dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE):
+    """Create the process-wide Postgres connection pool (no-op if it already exists)."""
+    global _db_pool, _db_pool_slots
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ThreadedConnectionPool(min_size, max_size, dsn)
+            _db_pool_slots = threading.BoundedSemaphore(max_size)
+            _db_pool_stats["max_size"] = max_size
+            logger.info(f"Database connection pool created (min={min_size}, max={max_size})")
+    return _db_pool
+
+def _checkout_connection():
+    """Take a live connection from the pool, replacing closed or unhealthy ones."""
+    conn = _db_pool.getconn()
+    last_used = _db_last_used.get(id(conn))
+    healthy = not conn.closed
+    if healthy and last_used is not None and time.monotonic() - last_used > DB_HEALTHCHECK_INTERVAL:
+        try:
+            with conn.cursor() as c:
+                c.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            healthy = False
+    if not healthy:
+        logger.warning("Discarding broken database connection and reconnecting")
+        _db_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        with _db_pool_lock:
+            _db_pool_stats["reconnects"] += 1
+        conn = _db_pool.getconn()
+    return conn
+
+@contextmanager
 def get_db_connection():
-    """Get the database connection from the session state (defined in app.py)."""
-    from streamlit.runtime.scriptrunner import get_script_run_ctx
-    ctx = get_script_run_ctx()
-    if ctx and hasattr(ctx.session_state, 'db_connection'):
-        return ctx.session_state.db_connection
-    raise Exception("Database connection not found in session state")
+    """Borrow a connection from the process-wide pool for the duration of a with block.
 
-def init_database():
-    """Initialize the database with proper schema and handle migration."""
-    conn = get_db_connection()
-    if conn is None:
-        logger.error("Failed to establish database connection")
-        raise Exception("Database connection is not available")
-    c = conn.cursor()
+    Waits up to DB_POOL_TIMEOUT seconds when the pool is saturated. Connections
+    that fail with an operational error are closed instead of being returned.
+    """
+    if _db_pool is None:
+        raise Exception("Database connection pool is not initialized")
+    if not _db_pool_slots.acquire(blocking=False):
+        with _db_pool_lock:
+            _db_pool_stats["waits"] += 1
+        if not _db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+            with _db_pool_lock:
+                _db_pool_stats["timeouts"] += 1
+            raise Exception("Timed out waiting for a database connection")
+    conn = None
+    broken = False
+    try:
+        conn = _checkout_connection()
+        with _db_pool_lock:
+            _db_pool_stats["borrows"] += 1
+            _db_pool_stats["in_use"] += 1
+            _db_pool_stats["peak_in_use"] = max(_db_pool_stats["peak_in_use"], _db_pool_stats["in_use"])
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if conn is not None:
+            with _db_pool_lock:
+                _db_pool_stats["in_use"] -= 1
+            broken = broken or bool(conn.closed)
+            if broken:
+                _db_last_used.pop(id(conn), None)
+            else:
+                _db_last_used[id(conn)] = time.monotonic()
+            _db_pool.putconn(conn, close=broken)
+        _db_pool_slots.release()
+
+def get_db_pool_stats() -> Dict[str, int]:
+    """Return connection pool usage and saturation counters."""
+    with _db_pool_lock:
+        return dict(_db_pool_stats)
 
+def _retry_on_disconnect(fn):
+    """Run a helper again, once, on a fresh connection if its connection drops.
+
+    The server can close a pooled connection between health checks, so the first
+    statement on it fails; get_db_connection discards that connection and the
+    retry checks out another. Only for reads and single-statement writes, which
+    are safe to repeat when the first attempt never reached the server.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.warning(f"{fn.__name__} lost its database connection ({e}); retrying once")
+            with _db_pool_lock:
+                _db_pool_stats["retries"] += 1
+            return fn(*args, **kwargs)
+    return wrapper
+
+def _migration_001_base_schema(c):
+    """Base schema: users, chat_history, user_activity and file_processing (with legacy column fixes)."""
     # Create or update users table
     c.execute('''CREATE TABLE IF NOT EXISTS users (
                  id SERIAL PRIMARY KEY,
@@ -140,7 +417,6 @@ def init_database():
                 file_sources TEXT)''')
             c.execute("INSERT INTO chat_history (username, chat_id, timestamp, user_message, bot_response) SELECT username, chat_id, timestamp, user_message, bot_response FROM chat_history_old")
             c.execute("DROP TABLE chat_history_old")
-            conn.commit()
             logger.info("Migrated chat_history table to include file_sources column")
     else:
         c.execute('''CREATE TABLE IF NOT EXISTS chat_history (
@@ -168,7 +444,6 @@ def init_database():
                 timestamp TEXT DEFAULT CURRENT_TIMESTAMP)''')
             c.execute("INSERT INTO user_activity (username, activity_type, timestamp) SELECT username, activity_type, timestamp FROM user_activity_old")
             c.execute("DROP TABLE user_activity_old")
-            conn.commit()
             logger.info("Migrated user_activity table to include details column")
     else:
         c.execute('''CREATE TABLE IF NOT EXISTS user_activity (
@@ -195,7 +470,6 @@ def init_database():
                 timestamp TEXT DEFAULT CURRENT_TIMESTAMP)''')
             c.execute("INSERT INTO file_processing (username, filename, status, timestamp) SELECT username, filename, status, timestamp FROM file_processing_old")
             c.execute("DROP TABLE file_processing_old")
-            conn.commit()
             logger.info("Migrated file_processing table to include size column")
     else:
         c.execute('''CREATE TABLE IF NOT EXISTS file_processing (
@@ -206,83 +480,562 @@ def init_database():
                      status TEXT,
                      timestamp TEXT DEFAULT CURRENT_TIMESTAMP)''')
 
-    conn.commit()
+def _write_file_sources_json(c, rows: List[tuple]):
+    if rows:
+        execute_values(c, "UPDATE chat_history SET file_sources_json = v.sources::jsonb FROM (VALUES %s) AS v(id, sources) WHERE chat_history.id = v.id",
+                       rows, page_size=len(rows))
 
-def login_user_base64(username: str, password: str) -> bool:
-    """Authenticate a user with base64-encoded hashed password."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT password FROM users WHERE username = %s", (username,))
-    result = c.fetchone()
-    if result:
-        hashed_b64 = result[0]
+def _migration_002_chat_history_types_and_indexes(c):
+    """Native timestamptz and jsonb columns on chat_history, plus lookup indexes."""
+    c.execute("ALTER TABLE chat_history ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING timestamp::timestamptz")
+    # file_sources held str(list); parse it in Python rather than eval-ing it in SQL.
+    # Rows stream from a server-side cursor and are written back in batches, so
+    # memory stays flat however large chat_history is.
+    c.execute("ALTER TABLE chat_history ADD COLUMN file_sources_json JSONB")
+    reader = c.connection.cursor(name="migration_002_file_sources")
+    reader.itersize = MIGRATION_BATCH_SIZE
+    reader.execute("SELECT id, file_sources FROM chat_history WHERE file_sources IS NOT NULL")
+    rows = []
+    for row_id, file_sources in reader:
         try:
-            hashed_password = base64.b64decode(hashed_b64.encode('utf-8'))
-            return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
-        except Exception as e:
-            logger.error(f"Password verification error: {e}")
-            return False
-    return False
+            sources = ast.literal_eval(file_sources)
+        except (ValueError, SyntaxError):
+            logger.warning(f"Dropping unparseable file_sources for chat_history row {row_id}")
+            continue
+        rows.append((row_id, Json(list(sources))))
+        if len(rows) >= MIGRATION_BATCH_SIZE:
+            _write_file_sources_json(c, rows)
+            rows = []
+    reader.close()
+    _write_file_sources_json(c, rows)
+    c.execute("ALTER TABLE chat_history DROP COLUMN file_sources")
+    c.execute("ALTER TABLE chat_history RENAME COLUMN file_sources_json TO file_sources")
+    c.execute("CREATE INDEX IF NOT EXISTS chat_history_user_chat_ts_idx ON chat_history (username, chat_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS user_activity_username_idx ON user_activity (username)")
+
+def _migration_003_chat_collections(c):
+    """Durable reference from each chat to its vector collection."""
+    c.execute('''CREATE TABLE IF NOT EXISTS chat_collections (
+                 username TEXT NOT NULL,
+                 chat_id INTEGER NOT NULL,
+                 collection_name TEXT NOT NULL,
+                 file_keys JSONB NOT NULL DEFAULT '{}',
+                 chunk_count INTEGER NOT NULL DEFAULT 0,
+                 last_used_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                 PRIMARY KEY (username, chat_id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS chat_collections_last_used_idx ON chat_collections (last_used_at)")
+
+def _migration_004_chat_id_sequence(c):
+    """Allocate chat ids from a sequence instead of max(chat_id) + 1 per user."""
+    c.execute("CREATE SEQUENCE IF NOT EXISTS chat_id_seq")
+    c.execute('''SELECT setval('chat_id_seq', GREATEST(
+                     (SELECT COALESCE(MAX(chat_id), 0) FROM chat_history),
+                     (SELECT COALESCE(MAX(chat_id), 0) FROM chat_collections)) + 1, false)''')
+
+def _migration_005_chat_history_keyset_index(c):
+    """Index for paging a chat's history newest first by row id."""
+    c.execute("CREATE INDEX IF NOT EXISTS chat_history_user_chat_id_idx ON chat_history (username, chat_id, id)")
+
+# Ordered (version, description, migrate(cursor)) entries; append new ones, never edit applied ones
+SCHEMA_MIGRATIONS = [
+    (1, "base schema", _migration_001_base_schema),
+    (2, "chat_history timestamptz/jsonb and indexes", _migration_002_chat_history_types_and_indexes),
+    (3, "chat_collections", _migration_003_chat_collections),
+    (4, "chat_id sequence", _migration_004_chat_id_sequence),
+    (5, "chat_history keyset index", _migration_005_chat_history_keyset_index),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+SCHEMA_LOCK_ID = 7236001  # pg advisory lock key serializing migrations across processes
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def _current_schema_version(c) -> int:
+    c.execute("SELECT to_regclass('public.schema_version') IS NOT NULL")
+    if not c.fetchone()[0]:
+        return 0
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return c.fetchone()[0]
+
+def init_database():
+    """Apply pending schema migrations under an advisory lock, once per process."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            if _current_schema_version(c) < SCHEMA_VERSION:
+                c.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+                c.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                             version INTEGER PRIMARY KEY,
+                             description TEXT NOT NULL,
+                             applied_at TIMESTAMPTZ NOT NULL DEFAULT now())''')
+                current_version = _current_schema_version(c)  # Re-read under the lock
+                for version, description, migrate in SCHEMA_MIGRATIONS:
+                    if version > current_version:
+                        migrate(c)
+                        c.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (version, description))
+                        logger.info(f"Applied schema migration {version}: {description}")
+            conn.commit()
+        _schema_ready = True
+
+class LoginThrottledError(Exception):
+    """Too many recent failed logins for a username or client IP."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many failed login attempts; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class LoginThrottle:
+    """Sliding-window count of failed logins per username and per client IP."""
+
+    def __init__(self, max_user_failures: int = AUTH_MAX_USER_FAILURES, max_ip_failures: int = AUTH_MAX_IP_FAILURES,
+                 window: float = AUTH_FAILURE_WINDOW):
+        self.limits = {"user": max_user_failures, "ip": max_ip_failures}
+        self.window = window
+        self._failures: Dict[tuple, deque] = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def _keys(self, username: str, client_ip: str = None) -> List[tuple]:
+        keys = [("user", username.lower())]
+        if client_ip:
+            keys.append(("ip", client_ip))
+        return keys
+
+    def retry_after(self, username: str, client_ip: str = None) -> float:
+        """Seconds until username/client_ip may try again (0 when not blocked)."""
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in self._keys(username, client_ip):
+                failures = self._failures.get(key)
+                if not failures:
+                    continue
+                while failures and now - failures[0] > self.window:
+                    failures.popleft()
+                if len(failures) >= self.limits[key[0]]:
+                    wait = max(wait, failures[0] + self.window - now)
+                elif not failures:
+                    del self._failures[key]
+        return wait
+
+    def record_failure(self, username: str, client_ip: str = None):
+        now = time.monotonic()
+        with self._lock:
+            for key in self._keys(username, client_ip):
+                failures = self._failures.setdefault(key, deque())
+                failures.append(now)
+                while len(failures) > self.limits[key[0]]:
+                    failures.popleft()
+            if now - self._last_prune > self.window:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        expired = [key for key, failures in self._failures.items() if not failures or now - failures[-1] > self.window]
+        for key in expired:
+            del self._failures[key]
+        self._last_prune = now
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._failures)
+
+    def reset(self, username: str):
+        with self._lock:
+            self._failures.pop(("user", username.lower()), None)
+
+_login_throttle = LoginThrottle()
+
+def forwarded_client_ip(headers, peer_ip: str = None, trusted_proxies: int = AUTH_TRUSTED_PROXIES) -> str:
+    """Client address for throttling: the X-Forwarded-For entry trusted_proxies places from the right, else the peer."""
+    if trusted_proxies <= 0:
+        return peer_ip or None
+    forwarded = [entry.strip() for entry in headers.get("X-Forwarded-For", "").split(",") if entry.strip()]
+    if forwarded:
+        return forwarded[-min(trusted_proxies, len(forwarded))]
+    return headers.get("X-Real-Ip") or peer_ip or None
+
+def get_auth_pool() -> ThreadPoolExecutor:
+    """Return the process-wide password hashing pool (bcrypt releases the GIL, so threads run in parallel)."""
+    global _auth_pool
+    with _db_pool_lock:
+        if _auth_pool is None:
+            _auth_pool = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+    return _auth_pool
+
+def _hash_password(password: str) -> str:
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS))
+    return base64.b64encode(hashed).decode('utf-8')
+
+_dummy_password_hash = None
+
+def _verify_password(password: str, hashed_b64: str) -> tuple:
+    """Return (matches, rehashed_b64); rehashed_b64 is set when the stored hash uses another work factor."""
+    global _dummy_password_hash
+    if hashed_b64 is None:
+        # Unknown usernames cost as much as real ones, so timing does not reveal which exist
+        _dummy_password_hash = _dummy_password_hash or bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(BCRYPT_ROUNDS))
+        bcrypt.checkpw(password.encode('utf-8'), _dummy_password_hash)
+        return False, None
+    hashed_password = base64.b64decode(hashed_b64.encode('utf-8'))
+    if not bcrypt.checkpw(password.encode('utf-8'), hashed_password):
+        return False, None
+    rounds = int(hashed_password.split(b"$")[2])
+    return True, _hash_password(password) if rounds != BCRYPT_ROUNDS else None
+
+@_retry_on_disconnect
+def _get_password_hash(username: str) -> str:
+    """Return the stored base64 bcrypt hash for username, or None."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT password FROM users WHERE username = %s", (username,))
+        result = c.fetchone()
+        return result[0] if result else None
+
+def login_user_base64(username: str, password: str, client_ip: str = None) -> bool:
+    """Authenticate a user with base64-encoded hashed password; raises LoginThrottledError after too many failures."""
+    retry_after = _login_throttle.retry_after(username, client_ip)
+    if retry_after > 0:
+        raise LoginThrottledError(retry_after)
+    try:
+        matches, rehashed_b64 = get_auth_pool().submit(_verify_password, password, _get_password_hash(username)).result()
+    except Exception as e:
+        logger.error(f"Password verification error: {e}")
+        matches, rehashed_b64 = False, None
+    if not matches:
+        _login_throttle.record_failure(username, client_ip)
+        return False
+    _login_throttle.reset(username)
+    if rehashed_b64:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("UPDATE users SET password = %s WHERE username = %s", (rehashed_b64, username))
+            conn.commit()
+        logger.info(f"Rehashed password for {username} with work factor {BCRYPT_ROUNDS}")
+    return True
 
 def register_user_base64(username: str, password: str, display_name: str = None) -> bool:
     """Register a new user with base64-encoded hashed password and display name."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    hashed_b64 = base64.b64encode(hashed).decode('utf-8')
+    hashed_b64 = get_auth_pool().submit(_hash_password, password).result()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("INSERT INTO users (username, password, display_name) VALUES (%s, %s, %s)", (username, hashed_b64, display_name))
+            conn.commit()
+            return True
+        except psycopg2.IntegrityError:
+            return False
+
+def issue_session_token(username: str, ttl: float = SESSION_TOKEN_TTL) -> str:
+    """Sign a short-lived token recording that username has authenticated."""
+    expires = int(time.time() + ttl)
+    payload = f"{base64.urlsafe_b64encode(username.encode('utf-8')).decode('ascii')}.{expires}"
+    signature = hmac.new(SESSION_TOKEN_SECRET, payload.encode('ascii'), hashlib.sha256).hexdigest()
+    return f"{payload}.{signature}"
+
+def verify_session_token(token: str) -> str:
+    """Return the username a valid, unexpired token was issued for, or None. No bcrypt involved."""
     try:
-        c.execute("INSERT INTO users (username, password, display_name) VALUES (%s, %s, %s)", (username, hashed_b64, display_name))
-        conn.commit()
-        return True
-    except psycopg2.IntegrityError:
-        return False
+        encoded_username, expires, signature = token.split(".")
+        payload = f"{encoded_username}.{expires}"
+        expected = hmac.new(SESSION_TOKEN_SECRET, payload.encode('ascii'), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected) or int(expires) < time.time():
+            return None
+        return base64.urlsafe_b64decode(encoded_username.encode('ascii')).decode('utf-8')
+    except (AttributeError, ValueError):
+        return None
 
+def _format_db_timestamp(value: datetime) -> str:
+    """Render a timestamptz in server-local time, in the format the UI expects."""
+    return value.astimezone().strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+@_retry_on_disconnect
 def save_chat_history(username: str, user_message: str, bot_response: str, chat_id: int = 1, file_sources: list = None):
     """Save chat history to the database with chat_id and file_sources."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO chat_history (username, chat_id, timestamp, user_message, bot_response, file_sources) VALUES (%s, %s, %s, %s, %s, %s)",
-              (username, chat_id, timestamp, user_message, bot_response, str(file_sources) if file_sources else None))
-    conn.commit()
-
-def get_chat_history(username: str, chat_id: int) -> List[dict]:
-    """Retrieve chat history for a user and specific chat_id."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT user_message, bot_response, timestamp, file_sources FROM chat_history WHERE username = %s AND chat_id = %s ORDER BY timestamp",
-              (username, chat_id))
-    history = [{"user_message": row[0], "bot_response": row[1], "timestamp": row[2], "file_sources": eval(row[3]) if row[3] else []} for row in c.fetchall()]
-    return history
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        timestamp = datetime.now().astimezone()
+        c.execute("INSERT INTO chat_history (username, chat_id, timestamp, user_message, bot_response, file_sources) VALUES (%s, %s, %s, %s, %s, %s)",
+                  (username, chat_id, timestamp, user_message, bot_response, Json(file_sources) if file_sources else None))
+        conn.commit()
+    with _user_cache_lock:
+        chats = _user_cache.get(username, {}).get("chats")
+        if chats is not None and chat_id not in chats:
+            chats.append(chat_id)
+            chats.sort(reverse=True)
+
+@_retry_on_disconnect
+def get_chat_history(username: str, chat_id: int, limit: int = None, before_id: int = None) -> List[dict]:
+    """Retrieve chat history for a user and specific chat_id, oldest first.
+
+    With limit, returns only the newest limit turns older than the row id
+    before_id (keyset pagination); pass the smallest returned "id" as
+    before_id to fetch the previous page.
+    """
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        if limit is None:
+            c.execute("SELECT id, user_message, bot_response, timestamp, file_sources FROM chat_history WHERE username = %s AND chat_id = %s ORDER BY timestamp",
+                      (username, chat_id))
+            rows = c.fetchall()
+        else:
+            c.execute("SELECT id, user_message, bot_response, timestamp, file_sources FROM chat_history WHERE username = %s AND chat_id = %s AND id < %s ORDER BY id DESC LIMIT %s",
+                      (username, chat_id, before_id if before_id is not None else 2 ** 31 - 1, limit))
+            rows = list(reversed(c.fetchall()))
+        history = [{"id": row[0], "user_message": row[1], "bot_response": row[2], "timestamp": _format_db_timestamp(row[3]), "file_sources": row[4] or []} for row in rows]
+        return history
+
+@_retry_on_disconnect
+def get_chat_file_sources(username: str, chat_id: int) -> List[str]:
+    """Distinct filenames cited anywhere in a chat's history."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT jsonb_array_elements_text(file_sources) FROM chat_history WHERE username = %s AND chat_id = %s AND file_sources IS NOT NULL",
+                  (username, chat_id))
+        return [row[0] for row in c.fetchall()]
+
+def _cached_user_entry(username: str) -> dict:
+    """Return username's cache entry (caller holds _user_cache_lock), resetting it after USER_CACHE_TTL."""
+    entry = _user_cache.get(username)
+    if entry is None or time.monotonic() - entry["loaded_at"] > USER_CACHE_TTL:
+        entry = _user_cache[username] = {"chats": None, "activities": None, "loaded_at": time.monotonic()}
+    return entry
+
+def invalidate_user_cache(username: str = None):
+    """Forget cached chat lists and activity counts for username (or everyone)."""
+    with _user_cache_lock:
+        if username is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(username, None)
 
+@_retry_on_disconnect
 def get_user_chats(username: str) -> List[int]:
-    """Retrieve distinct chat IDs for a user."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT chat_id FROM chat_history WHERE username = %s ORDER BY chat_id DESC", (username,))
-    chat_ids = [row[0] for row in c.fetchall()]
+    """Retrieve distinct chat IDs for a user, newest first (cached per user)."""
+    with _user_cache_lock:
+        chats = _cached_user_entry(username)["chats"]
+        if chats is not None:
+            return list(chats)
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT chat_id FROM chat_history WHERE username = %s ORDER BY chat_id DESC", (username,))
+        chat_ids = [row[0] for row in c.fetchall()]
+    with _user_cache_lock:
+        _cached_user_entry(username)["chats"] = list(chat_ids)
     return chat_ids
 
+@_retry_on_disconnect
+def _count_user_activities(username: str) -> int:
+    """Count username's logged activities in the database."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM user_activity WHERE username = %s", (username,))
+        return c.fetchone()[0]
+
+def get_user_analytics(username: str) -> dict:
+    """Get a user's chat and activity counts (cached per user)."""
+    try:
+        total_chats = len(get_user_chats(username))
+        with _user_cache_lock:
+            total_activities = _cached_user_entry(username)["activities"]
+        if total_activities is None:
+            total_activities = _count_user_activities(username) + get_audit_buffer().pending_count("user_activity", username)
+            with _user_cache_lock:
+                _cached_user_entry(username)["activities"] = total_activities
+        return {"total_activities": total_activities, "total_chats": total_chats}
+    except Exception as e:
+        logger.error(f"Error getting analytics: {str(e)}")
+        return {"total_activities": 0, "total_chats": 0}
+
+@_retry_on_disconnect
+def allocate_chat_id() -> int:
+    """Reserve a new chat id from the chat_id sequence."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT nextval('chat_id_seq')")
+        chat_id = c.fetchone()[0]
+        conn.commit()
+        return chat_id
+
+@_retry_on_disconnect
 def delete_chat_history(username: str, chat_id: int):
     """Delete chat history for a specific chat_id."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM chat_history WHERE username = %s AND chat_id = %s", (username, chat_id))
-    conn.commit()
-    logger.info(f"Deleted chat history for chat_id: {chat_id} for user: {username}")
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM chat_history WHERE username = %s AND chat_id = %s", (username, chat_id))
+        c.execute("DELETE FROM chat_collections WHERE username = %s AND chat_id = %s", (username, chat_id))
+        conn.commit()
+        logger.info(f"Deleted chat history for chat_id: {chat_id} for user: {username}")
+    with _user_cache_lock:
+        chats = _user_cache.get(username, {}).get("chats")
+        if chats is not None and chat_id in chats:
+            chats.remove(chat_id)
+
+@_retry_on_disconnect
+def save_chat_collection(username: str, chat_id: int, collection_name: str, file_keys: dict, chunk_count: int):
+    """Record (or refresh) the vector collection that holds a chat's document chunks."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO chat_collections (username, chat_id, collection_name, file_keys, chunk_count, last_used_at)
+                     VALUES (%s, %s, %s, %s, %s, now())
+                     ON CONFLICT (username, chat_id) DO UPDATE SET
+                         collection_name = EXCLUDED.collection_name,
+                         file_keys = EXCLUDED.file_keys,
+                         chunk_count = EXCLUDED.chunk_count,
+                         last_used_at = now()''',
+                  (username, chat_id, collection_name, Json(file_keys), chunk_count))
+        conn.commit()
+
+@_retry_on_disconnect
+def get_chat_collection(username: str, chat_id: int) -> dict:
+    """Return the collection reference for a chat (and mark it as used), or None."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE chat_collections SET last_used_at = now() WHERE username = %s AND chat_id = %s RETURNING collection_name, file_keys, chunk_count",
+                  (username, chat_id))
+        row = c.fetchone()
+        conn.commit()
+        if not row:
+            return None
+        return {"collection_name": row[0], "file_keys": row[1] or {}, "chunk_count": row[2]}
+
+@_retry_on_disconnect
+def evict_chat_collections(max_chunks: int) -> List[str]:
+    """Drop the least recently used collection references beyond max_chunks chunks in total.
+
+    Returns the collection names that were dropped so their vectors can be deleted.
+    """
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''DELETE FROM chat_collections WHERE (username, chat_id) IN (
+                         SELECT username, chat_id FROM (
+                             SELECT username, chat_id, SUM(chunk_count) OVER (ORDER BY last_used_at DESC) AS running_chunks
+                             FROM chat_collections) ranked
+                         WHERE running_chunks > %s)
+                     RETURNING collection_name''', (max_chunks,))
+        names = [row[0] for row in c.fetchall()]
+        conn.commit()
+        return names
+
+class AuditLogBuffer:
+    """Write-behind buffer for user_activity and file_processing rows.
+
+    Rows are queued in memory and written by a background thread with one
+    multi-row INSERT per table, whenever flush_size rows are pending or every
+    flush_interval seconds. close() flushes whatever is left. Rows stay queued
+    while the database is unreachable; if a batch is rejected because of its
+    data, it is retried row by row and only the offending rows are dropped.
+    """
+
+    COLUMNS = {
+        "user_activity": ("username", "activity_type", "details", "timestamp"),
+        "file_processing": ("username", "filename", "size", "status", "timestamp"),
+    }
+    # Errors caused by the contents of a row (e.g. a NUL byte in a string) rather than by the database
+    ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, ValueError)
+
+    def __init__(self, flush_size: int = AUDIT_FLUSH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = flush_size * 50  # Drop the oldest rows beyond this if the database is down
+        self._rows = {table: [] for table in self.COLUMNS}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="audit-log-flusher", daemon=True)
+        self._thread.start()
+
+    def add(self, table: str, row: tuple):
+        with self._lock:
+            self._rows[table].append(row)
+            pending = sum(len(rows) for rows in self._rows.values())
+        if pending >= self.flush_size:
+            self._wake.set()
+
+    def pending_count(self, table: str, username: str) -> int:
+        """Number of queued, not yet written rows in table for username."""
+        with self._lock:
+            return sum(1 for row in self._rows[table] if row[0] == username)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batches, self._rows = self._rows, {table: [] for table in self.COLUMNS}
+            for table, rows in batches.items():
+                if not rows:
+                    continue
+                columns = self.COLUMNS[table]
+                try:
+                    with get_db_connection() as conn:
+                        c = conn.cursor()
+                        execute_values(c, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows)
+                        conn.commit()
+                except self.ROW_ERRORS as e:
+                    logger.warning(f"Flushing {len(rows)} {table} rows failed ({e}); retrying row by row")
+                    self._flush_rows_singly(table, rows)
+                except Exception as e:
+                    logger.error(f"Failed to flush {len(rows)} {table} rows: {e}")
+                    self._requeue(table, rows)
+
+    def _flush_rows_singly(self, table: str, rows: List[tuple]):
+        """Insert rows one at a time, dropping those the database rejects so they cannot block the rest."""
+        columns = self.COLUMNS[table]
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        written = 0
+        try:
+            with get_db_connection() as conn:
+                c = conn.cursor()
+                for row in rows:
+                    try:
+                        c.execute(query, row)
+                        conn.commit()
+                    except self.ROW_ERRORS as e:
+                        conn.rollback()
+                        logger.error(f"Dropping {table} row for {row[0]}: {e}")
+                    written += 1
+        except Exception as e:
+            logger.error(f"Failed to flush {len(rows) - written} {table} rows: {e}")
+            self._requeue(table, rows[written:])
+
+    def _requeue(self, table: str, rows: List[tuple]):
+        with self._lock:
+            self._rows[table] = (rows + self._rows[table])[-self.max_pending:]
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+_audit_buffer = None
+
+def get_audit_buffer() -> AuditLogBuffer:
+    """Return the process-wide audit log buffer, starting its flusher thread on first use."""
+    global _audit_buffer
+    with _db_pool_lock:
+        if _audit_buffer is None:
+            _audit_buffer = AuditLogBuffer()
+            atexit.register(_audit_buffer.close)
+    return _audit_buffer
 
 def log_user_activity(username: str, activity_type: str, details: str = None):
-    """Log user activity."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO user_activity (username, activity_type, details) VALUES (%s, %s, %s)",
-              (username, activity_type, details))
-    conn.commit()
+    """Log user activity (buffered; written in the background)."""
+    get_audit_buffer().add("user_activity", (username, activity_type, details, datetime.now(timezone.utc)))
+    with _user_cache_lock:
+        entry = _user_cache.get(username)
+        if entry is not None and entry["activities"] is not None:
+            entry["activities"] += 1
 
 def log_file_processing(username: str, filename: str, size: int, status: str):
-    """Log file processing details."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO file_processing (username, filename, size, status) VALUES (%s, %s, %s, %s)",
-              (username, filename, size, status))
-    conn.commit()
\ No newline at end of file
+    """Log file processing details (buffered; written in the background)."""
+    get_audit_buffer().add("file_processing", (username, filename, size, status, datetime.now(timezone.utc)))